@@ -0,0 +1,114 @@
+"""
+Synthetic documents for the benchmarks.
+
+Every generator takes the approximate size of the document as JSON in
+bytes and builds it from a repeated unit, so the shapes can be scaled
+from a few kilobytes to gigabytes. Random content is seeded, the same
+size always gives the same document.
+"""
+
+import json
+import random
+
+SCALES = {
+    "1KB": 1000,
+    "100KB": 100 * 1000,
+    "1MB": 1000 * 1000,
+    "10MB": 10 * 1000 * 1000,
+    "100MB": 100 * 1000 * 1000,
+    "1GB": 1000 * 1000 * 1000,
+}
+
+# depth of the branches of the deep documents, kept below the recursion
+# limit so copy.deepcopy in nested_alter still works on them
+DEEP_BRANCH_DEPTH = 200
+
+
+def _repeat(unit, size):
+    """number of copies of the unit needed for a document of the size"""
+    return max(1, size // len(json.dumps(unit(0, random.Random(0)))))
+
+
+def _record(i, rng):
+    return {
+        "id": i,
+        "name": "record %d" % i,
+        "active": rng.random() < 0.5,
+        "score": rng.random(),
+        "owner": {"name": "owner %d" % rng.randint(0, 999), "email": "o@x.org"},
+    }
+
+
+def wide(size):
+    """one dict with many keys holding small records"""
+    rng = random.Random(size)
+    return dict(("key_%d" % i, _record(i, rng)) for i in range(_repeat(_record, size)))
+
+
+def _branch(i, rng):
+    node = {"name": "leaf %d" % i, "value": rng.random()}
+    for level in range(DEEP_BRANCH_DEPTH):
+        node = {"level": level, "child": node}
+    return node
+
+
+def deep(size):
+    """a list of branches nested DEEP_BRANCH_DEPTH levels deep"""
+    rng = random.Random(size)
+    return [_branch(i, rng) for i in range(_repeat(_branch, size))]
+
+
+def _list_record(i, rng):
+    return {
+        "id": i,
+        "samples": [rng.random() for _ in range(50)],
+        "tags": ["tag%d" % rng.randint(0, 20) for _ in range(5)],
+        "events": [{"name": "event %d" % j, "at": j} for j in range(5)],
+        "matrix": [[rng.randint(0, 9) for _ in range(5)] for _ in range(5)],
+    }
+
+
+def list_heavy(size):
+    """records dominated by lists of scalars, lists of lists and of dicts"""
+    rng = random.Random(size)
+    return {
+        "records": [_list_record(i, rng) for i in range(_repeat(_list_record, size))]
+    }
+
+
+_WILD_KEYS = ["Name", "user_name", "NAME_FULL", "email", "EmailAddress", "e_mail"]
+
+
+def _wild_record(i, rng):
+    return dict(
+        ("%s_%d" % (rng.choice(_WILD_KEYS), j), "value %d" % j) for j in range(10)
+    )
+
+
+def wild_keys(size):
+    """records whose keys are case and affix variants of a few names"""
+    rng = random.Random(size)
+    return [_wild_record(i, rng) for i in range(_repeat(_wild_record, size))]
+
+
+SHAPES = {
+    "wide": wide,
+    "deep": deep,
+    "list_heavy": list_heavy,
+    "wild_keys": wild_keys,
+}
+
+
+def count_nodes(document):
+    """number of dict items and list elements in the document, plus itself"""
+    nodes = 1
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            nodes += len(value)
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            nodes += len(value)
+            stack.extend(value)
+    return nodes
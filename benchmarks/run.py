@@ -0,0 +1,210 @@
+"""
+Benchmark the public functions of nested_lookup on synthetic documents.
+
+Reports the throughput in nodes (dict items and list elements) walked per
+second and the peak memory allocated by each call, and saves the results
+as a JSON baseline to compare later runs against:
+
+    python benchmarks/run.py --scales 1KB,1MB --save baseline.json
+    python benchmarks/run.py --scales 1KB,1MB --compare baseline.json
+
+The larger scales (100MB, 1GB) need several times their size in memory.
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generators import SCALES, SHAPES, count_nodes  # noqa: E402
+
+from nested_lookup import (  # noqa: E402
+    nested_lookup,
+    get_all_keys,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    get_occurrences_and_values,
+    nested_update,
+    nested_delete,
+    nested_alter,
+)
+
+# key, wild key and value to search for in every shape
+QUERIES = {
+    "wide": ("email", "NAME", "o@x.org"),
+    "deep": ("name", "LEV", 0.5),
+    "list_heavy": ("name", "NAM", "tag3"),
+    "wild_keys": ("email_3", "EMAIL", "value 3"),
+}
+
+
+def _as_list(document):
+    return document if isinstance(document, list) else [document]
+
+
+# name -> (function of document and query, whether it mutates the document)
+BENCHMARKS = {
+    "nested_lookup": (lambda d, q: nested_lookup(q[0], d), False),
+    "nested_lookup_wild": (lambda d, q: nested_lookup(q[1], d, wild=True), False),
+    "get_all_keys": (lambda d, q: get_all_keys(d), False),
+    "get_occurrence_of_key": (lambda d, q: get_occurrence_of_key(d, q[0]), False),
+    "get_occurrence_of_value": (lambda d, q: get_occurrence_of_value(d, q[2]), False),
+    "get_occurrences_and_values": (
+        lambda d, q: get_occurrences_and_values(_as_list(d), q[2]),
+        False,
+    ),
+    "nested_update": (lambda d, q: nested_update(d, q[0], "updated"), False),
+    "nested_update_in_place": (
+        lambda d, q: nested_update(d, q[0], "updated", in_place=True),
+        True,
+    ),
+    "nested_delete": (lambda d, q: nested_delete(d, q[0]), False),
+    "nested_delete_in_place": (
+        lambda d, q: nested_delete(d, q[0], in_place=True),
+        True,
+    ),
+    "nested_alter": (lambda d, q: nested_alter(d, q[0], str), False),
+    "nested_alter_in_place": (
+        lambda d, q: nested_alter(d, q[0], str, in_place=True),
+        True,
+    ),
+}
+
+
+def measure(function, document, query, mutates, repeat, memory):
+    """return the best time of the runs and the peak memory of one run"""
+    seconds = None
+    for _ in range(repeat):
+        subject = copy.deepcopy(document) if mutates else document
+        gc.collect()
+        start = time.perf_counter()
+        function(subject, query)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak = None
+    if memory:
+        subject = copy.deepcopy(document) if mutates else document
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function(subject, query)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def run(shapes, scales, functions, repeat, memory):
+    results = {}
+    for shape in shapes:
+        for scale in scales:
+            document = SHAPES[shape](SCALES[scale])
+            nodes = count_nodes(document)
+            for name in functions:
+                function, mutates = BENCHMARKS[name]
+                seconds, peak = measure(
+                    function, document, QUERIES[shape], mutates, repeat, memory
+                )
+                result = {
+                    "function": name,
+                    "shape": shape,
+                    "scale": scale,
+                    "nodes": nodes,
+                    "seconds": seconds,
+                    "nodes_per_second": nodes / seconds if seconds else None,
+                    "peak_bytes": peak,
+                }
+                results["%s/%s/%s" % (name, shape, scale)] = result
+                report(result)
+            del document
+    return results
+
+
+def report(result):
+    line = "%-28s %-11s %-6s %12.0f nodes/s" % (
+        result["function"],
+        result["shape"],
+        result["scale"],
+        result["nodes_per_second"] or 0,
+    )
+    if result["peak_bytes"] is not None:
+        line += " %10.1f KiB peak" % (result["peak_bytes"] / 1024.0)
+    print(line)
+
+
+def compare(results, baseline, tolerance):
+    """print the change against the baseline, return the regressions"""
+    regressions = []
+    print("\nagainst baseline (throughput ratio, >1 is faster):")
+    for key, result in sorted(results.items()):
+        before = baseline.get(key)
+        if not before or not before["nodes_per_second"]:
+            continue
+        ratio = result["nodes_per_second"] / before["nodes_per_second"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print("%-50s %6.2fx%s" % (key, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shapes", default=",".join(sorted(SHAPES)))
+    parser.add_argument("--scales", default="1KB,100KB,1MB")
+    parser.add_argument("--functions", default=",".join(sorted(BENCHMARKS)))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the peak memory runs"
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare to the results in this JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="slowdown reported as regression, as a fraction (default 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.shapes.split(","),
+        args.scales.split(","),
+        args.functions.split(","),
+        args.repeat,
+        not args.no_memory,
+    )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,39 @@
 from .nested_lookup import (
     nested_lookup,
+    iter_nested_lookup,
+    nested_find_first,
+    nested_contains,
+    nested_lookup_many,
     get_all_keys,
+    iter_all_keys,
     get_occurrence_of_key,
     get_occurrence_of_value,
-    get_occurrences_and_values
+    get_occurrences_and_values,
+    nested_find_values,
 )
-from .lookup_api import nested_update, nested_delete, nested_alter
+from .lookup_api import nested_update, nested_update_many, nested_delete, nested_alter
+from .index import NestedIndex
+from .stream import nested_lookup_stream
+from .msgpack_lookup import nested_lookup_msgpack
+from .matchers import (
+    Matcher,
+    ExactMatcher,
+    WildMatcher,
+    GlobMatcher,
+    RegexMatcher,
+    PrefixMatcher,
+    make_matcher,
+)
+from .batch import nested_lookup_batch
+from .jsonl import scan_jsonl, count_jsonl_value
+from .plan import LookupPlan, compile_lookup
+from .containers import register_container, unregister_container
+from .stats import TraversalStats, collect_stats, with_stats
+from .speedups import use_speedups
+from .persistent import PersistentMap, PersistentVector, freeze, thaw
+
+try:
+    from .async_api import anested_lookup, anested_update
+except SyntaxError:
+    # the coroutines need Python 3.5 or newer
+    pass
@@ -0,0 +1,525 @@
+/*
+ * Optional C implementation of the hot walks of nested_lookup.
+ *
+ * Every function walks the dicts and lists of a document depth first with
+ * an explicit stack, in the same order as nested_lookup.walker.walk, and
+ * does what the pure Python function does with every item. Dict and list
+ * subclasses, and the types given to containers() (the persistent types),
+ * are walked through their items() and iter() like the Python walk does.
+ * Other container types are only handled by the Python walk,
+ * nested_lookup/speedups.py does not call in here once any is registered.
+ * The functions writing in place find all the writes before making them,
+ * so nothing is written when one of them goes into a persistent type.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+enum {
+    LOOKUP,      /* values of the key */
+    ALL_KEYS,    /* keys of every dict */
+    COUNT_KEY,   /* items of the key whose value is not None */
+    COUNT_VALUE, /* dict values and list elements equal to the value */
+    DELETE,      /* delete the key from every dict, in place */
+    UPDATE       /* set the keys of a dict of key -> values, in place */
+};
+
+/* tuples of the other types walked like dicts and like lists */
+static PyObject *extra_mappings = NULL;
+static PyObject *extra_sequences = NULL;
+
+/* 1 if the type is a subclass of one of the types of the tuple */
+static int
+is_one_of(PyObject *value, PyObject *types)
+{
+    Py_ssize_t i;
+
+    if (types == NULL) {
+        return 0;
+    }
+    for (i = 0; i < PyTuple_GET_SIZE(types); i++) {
+        if (PyObject_TypeCheck(value, (PyTypeObject *)PyTuple_GET_ITEM(types, i))) {
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static int
+is_mapping(PyObject *value)
+{
+    return PyDict_Check(value) || is_one_of(value, extra_mappings);
+}
+
+typedef struct {
+    PyObject *container;
+    PyObject *iter; /* NULL for exact dicts and lists */
+    Py_ssize_t pos;
+    int is_dict;
+    int doomed; /* the dict holds the key of DELETE, its value is not walked */
+} Frame;
+
+typedef struct {
+    Frame *frames;
+    Py_ssize_t size;
+    Py_ssize_t capacity;
+} Stack;
+
+static void
+stack_clear(Stack *stack)
+{
+    while (stack->size > 0) {
+        Frame *frame = &stack->frames[--stack->size];
+        Py_XDECREF(frame->iter);
+        Py_DECREF(frame->container);
+    }
+    PyMem_Free(stack->frames);
+    stack->frames = NULL;
+    stack->capacity = 0;
+}
+
+/* depth of the first look for a container inside itself, like
+   _CYCLE_CHECK_DEPTH of nested_lookup.walker */
+#define CYCLE_CHECK_DEPTH 1000
+
+static int
+compare_pointers(const void *a, const void *b)
+{
+    PyObject *x = *(PyObject *const *)a, *y = *(PyObject *const *)b;
+    return x < y ? -1 : x > y;
+}
+
+/* ValueError if a container is on the stack twice, 0 or -1 */
+static int
+check_cycle(Stack *stack)
+{
+    Py_ssize_t i;
+    PyObject *found = NULL;
+    PyObject **containers = PyMem_New(PyObject *, stack->size);
+
+    if (containers == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (i = 0; i < stack->size; i++) {
+        containers[i] = stack->frames[i].container;
+    }
+    qsort(containers, stack->size, sizeof(PyObject *), compare_pointers);
+    for (i = 1; i < stack->size && found == NULL; i++) {
+        if (containers[i] == containers[i - 1]) {
+            found = containers[i];
+        }
+    }
+    PyMem_Free(containers);
+    if (found != NULL) {
+        PyErr_Format(PyExc_ValueError,
+                     "a %s of the document contains itself, its walk would "
+                     "never end", Py_TYPE(found)->tp_name);
+        return -1;
+    }
+    return 0;
+}
+
+/* add a write of the container and key to the writes, like
+   _check_in_place the persistent types given to containers() can not be
+   written. 0 or -1 */
+static int
+add_write(PyObject *writes, PyObject *container, PyObject *key)
+{
+    if (!PyDict_Check(container) && !PyList_Check(container)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "persistent containers can not be modified in place, "
+                        "use in_place=False to get their new version");
+        return -1;
+    }
+    if (PyList_Append(writes, container) < 0) {
+        return -1;
+    }
+    return PyList_Append(writes, key);
+}
+
+/* push the value on the stack if it is a dict or a list, 0 or -1 */
+static int
+enter(Stack *stack, PyObject *value, int mode, PyObject *arg, PyObject *writes)
+{
+    Frame *frame;
+    int is_dict = is_mapping(value);
+    int doomed = 0;
+
+    if (!is_dict && !PyList_Check(value) && !is_one_of(value, extra_sequences)) {
+        return 0;
+    }
+    if (is_dict && mode == DELETE) {
+        /* the Python walk finds the key as it enters a dict */
+        doomed = PySequence_Contains(value, arg);
+        if (doomed < 0 || (doomed && add_write(writes, value, arg) < 0)) {
+            return -1;
+        }
+    }
+    if (stack->size == stack->capacity) {
+        Py_ssize_t capacity = stack->capacity ? stack->capacity * 2 : 64;
+        Frame *frames = PyMem_Realloc(stack->frames, capacity * sizeof(Frame));
+        if (frames == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        stack->frames = frames;
+        stack->capacity = capacity;
+    }
+    frame = &stack->frames[stack->size];
+    frame->iter = NULL;
+    frame->pos = 0;
+    frame->is_dict = is_dict;
+    frame->doomed = doomed;
+    if (is_dict && !PyDict_CheckExact(value)) {
+        PyObject *items = PyObject_CallMethod(value, "items", NULL);
+        if (items == NULL) {
+            return -1;
+        }
+        frame->iter = PyObject_GetIter(items);
+        Py_DECREF(items);
+        if (frame->iter == NULL) {
+            return -1;
+        }
+    }
+    else if (!is_dict && !PyList_CheckExact(value)) {
+        frame->iter = PyObject_GetIter(value);
+        if (frame->iter == NULL) {
+            return -1;
+        }
+    }
+    Py_INCREF(value);
+    frame->container = value;
+    stack->size++;
+    return 0;
+}
+
+/* the next item of the frame as new references, 1, 0 at the end or -1 */
+static int
+next_item(Frame *frame, PyObject **key, PyObject **value)
+{
+    PyObject *item;
+
+    *key = NULL;
+    if (frame->iter == NULL) {
+        if (frame->is_dict) {
+            if (!PyDict_Next(frame->container, &frame->pos, key, value)) {
+                return 0;
+            }
+            Py_INCREF(*key);
+            Py_INCREF(*value);
+            return 1;
+        }
+        if (frame->pos >= PyList_GET_SIZE(frame->container)) {
+            return 0;
+        }
+        *value = PyList_GET_ITEM(frame->container, frame->pos++);
+        Py_INCREF(*value);
+        return 1;
+    }
+
+    item = PyIter_Next(frame->iter);
+    if (item == NULL) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+    if (!frame->is_dict) {
+        *value = item;
+        return 1;
+    }
+    if (!PyTuple_Check(item) || PyTuple_GET_SIZE(item) != 2) {
+        Py_DECREF(item);
+        PyErr_SetString(PyExc_ValueError, "items() must yield (key, value) pairs");
+        return -1;
+    }
+    *key = PyTuple_GET_ITEM(item, 0);
+    *value = PyTuple_GET_ITEM(item, 1);
+    Py_INCREF(*key);
+    Py_INCREF(*value);
+    Py_DECREF(item);
+    return 1;
+}
+
+/* set parent[key] to the next of the values, like _update_items */
+static int
+update_key(PyObject *parent, PyObject *key, PyObject *values)
+{
+    PyObject *first;
+    Py_ssize_t size;
+    int result;
+
+    first = PySequence_GetItem(values, 0);
+    if (first == NULL) {
+        return -1;
+    }
+    result = PyObject_SetItem(parent, key, first);
+    Py_DECREF(first);
+    if (result < 0) {
+        return -1;
+    }
+    size = PySequence_Size(values);
+    if (size < 0) {
+        return -1;
+    }
+    if (size > 1) {
+        return PySequence_DelItem(values, 0);
+    }
+    return 0;
+}
+
+/* make the writes found by the walk, the number of writes or -1 */
+static Py_ssize_t
+write_all(int mode, PyObject *arg, PyObject *writes)
+{
+    Py_ssize_t i, count = 0;
+    PyObject *container, *key, *values;
+    int status;
+
+    for (i = 0; i < PyList_GET_SIZE(writes); i += 2) {
+        container = PyList_GET_ITEM(writes, i);
+        key = PyList_GET_ITEM(writes, i + 1);
+        if (mode == DELETE) {
+            /* a dict found on several paths is found several times */
+            status = PySequence_Contains(container, key);
+            if (status > 0) {
+                status = PyObject_DelItem(container, key);
+                count++;
+            }
+        }
+        else {
+            values = PyDict_GetItemWithError(arg, key);
+            if (values == NULL) {
+                return -1;
+            }
+            Py_INCREF(values);
+            status = update_key(container, key, values);
+            Py_DECREF(values);
+            count++;
+        }
+        if (status < 0) {
+            return -1;
+        }
+    }
+    return count;
+}
+
+/* what the mode does with an item of a dict, 0 or -1 */
+static int
+visit_item(int mode, PyObject *arg, PyObject *parent, PyObject *key,
+           PyObject *value, PyObject *results, Py_ssize_t *count)
+{
+    int match;
+
+    switch (mode) {
+    case LOOKUP:
+        match = PyObject_RichCompareBool(arg, key, Py_EQ);
+        if (match > 0) {
+            return PyList_Append(results, value);
+        }
+        return match;
+    case ALL_KEYS:
+        return PyList_Append(results, key);
+    case COUNT_KEY:
+        if (value == Py_None) {
+            return 0;
+        }
+        match = PyObject_RichCompareBool(arg, key, Py_EQ);
+        if (match > 0) {
+            (*count)++;
+        }
+        return match < 0 ? -1 : 0;
+    case COUNT_VALUE:
+        match = PyObject_RichCompareBool(value, arg, Py_EQ);
+        if (match > 0) {
+            (*count)++;
+        }
+        return match < 0 ? -1 : 0;
+    case UPDATE:
+        match = PyDict_Contains(arg, key);
+        if (match > 0) {
+            return add_write(results, parent, key);
+        }
+        return match;
+    }
+    return 0;
+}
+
+static PyObject *
+run(PyObject *document, int mode, PyObject *arg)
+{
+    Stack stack = {NULL, 0, 0};
+    PyObject *results = NULL;
+    PyObject *key, *value;
+    Py_ssize_t count = 0;
+    Py_ssize_t check_at = CYCLE_CHECK_DEPTH;
+    int status;
+
+    if (mode != COUNT_KEY && mode != COUNT_VALUE) {
+        /* the writes of DELETE and UPDATE, container and key after key */
+        results = PyList_New(0);
+        if (results == NULL) {
+            return NULL;
+        }
+    }
+    if (enter(&stack, document, mode, arg, results) < 0) {
+        goto error;
+    }
+    while (stack.size > 0) {
+        Frame *frame = &stack.frames[stack.size - 1];
+        PyObject *parent = frame->container;
+
+        status = next_item(frame, &key, &value);
+        if (status < 0) {
+            goto error;
+        }
+        if (status == 0) {
+            stack.size--;
+            Py_XDECREF(frame->iter);
+            Py_DECREF(frame->container);
+            continue;
+        }
+        if (frame->doomed) {
+            /* the value of the deleted key is not walked, status is 1 */
+            status = PyObject_RichCompareBool(key, arg, Py_EQ);
+        }
+        else if (frame->is_dict) {
+            status = visit_item(mode, arg, parent, key, value, results, &count);
+        }
+        else if (mode == COUNT_VALUE && !is_mapping(value)) {
+            /* list elements count too, except for the dicts in lists */
+            status = visit_item(mode, arg, parent, key, value, results, &count);
+        }
+        else {
+            status = 0;
+        }
+        Py_XDECREF(key);
+        /* frame is invalid from here, the stack may be reallocated */
+        if (status == 0) {
+            status = enter(&stack, value, mode, arg, results);
+        }
+        else if (status > 0) {
+            status = 0;
+        }
+        if (status == 0 && stack.size > check_at) {
+            status = check_cycle(&stack);
+            check_at *= 2;
+        }
+        Py_DECREF(value);
+        if (status < 0) {
+            goto error;
+        }
+    }
+    stack_clear(&stack);
+    if (mode == DELETE || mode == UPDATE) {
+        count = write_all(mode, arg, results);
+        Py_DECREF(results);
+        return count < 0 ? NULL : PyLong_FromSsize_t(count);
+    }
+    if (results != NULL) {
+        return results;
+    }
+    return PyLong_FromSsize_t(count);
+
+error:
+    stack_clear(&stack);
+    Py_XDECREF(results);
+    return NULL;
+}
+
+static PyObject *
+speedups_lookup(PyObject *self, PyObject *args)
+{
+    PyObject *document, *key;
+    if (!PyArg_ParseTuple(args, "OO:lookup", &document, &key)) {
+        return NULL;
+    }
+    return run(document, LOOKUP, key);
+}
+
+static PyObject *
+speedups_all_keys(PyObject *self, PyObject *document)
+{
+    return run(document, ALL_KEYS, NULL);
+}
+
+static PyObject *
+speedups_count_key(PyObject *self, PyObject *args)
+{
+    PyObject *document, *key;
+    if (!PyArg_ParseTuple(args, "OO:count_key", &document, &key)) {
+        return NULL;
+    }
+    return run(document, COUNT_KEY, key);
+}
+
+static PyObject *
+speedups_count_value(PyObject *self, PyObject *args)
+{
+    PyObject *document, *value;
+    if (!PyArg_ParseTuple(args, "OO:count_value", &document, &value)) {
+        return NULL;
+    }
+    return run(document, COUNT_VALUE, value);
+}
+
+static PyObject *
+speedups_delete(PyObject *self, PyObject *args)
+{
+    PyObject *document, *key;
+    if (!PyArg_ParseTuple(args, "OO:delete", &document, &key)) {
+        return NULL;
+    }
+    return run(document, DELETE, key);
+}
+
+static PyObject *
+speedups_update(PyObject *self, PyObject *args)
+{
+    PyObject *document, *values;
+    if (!PyArg_ParseTuple(args, "OO!:update", &document, &PyDict_Type, &values)) {
+        return NULL;
+    }
+    return run(document, UPDATE, values);
+}
+
+static PyObject *
+speedups_containers(PyObject *self, PyObject *args)
+{
+    PyObject *mappings, *sequences;
+    if (!PyArg_ParseTuple(args, "O!O!:containers", &PyTuple_Type, &mappings,
+                          &PyTuple_Type, &sequences)) {
+        return NULL;
+    }
+    Py_INCREF(mappings);
+    Py_INCREF(sequences);
+    Py_XSETREF(extra_mappings, mappings);
+    Py_XSETREF(extra_sequences, sequences);
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef speedups_methods[] = {
+    {"lookup", speedups_lookup, METH_VARARGS,
+     "lookup(document, key) -> list of the values of the key"},
+    {"all_keys", speedups_all_keys, METH_O,
+     "all_keys(document) -> list of the keys of every dict"},
+    {"count_key", speedups_count_key, METH_VARARGS,
+     "count_key(document, key) -> number of the items of the key which are not None"},
+    {"count_value", speedups_count_value, METH_VARARGS,
+     "count_value(document, value) -> number of the occurrences of the value"},
+    {"delete", speedups_delete, METH_VARARGS,
+     "delete(document, key) -> number of the items of the key deleted in place"},
+    {"update", speedups_update, METH_VARARGS,
+     "update(document, values) -> number of the keys of the dict of key -> list "
+     "of values updated in place"},
+    {"containers", speedups_containers, METH_VARARGS,
+     "containers(mappings, sequences) -> None, walk the instances of the "
+     "tuples of types like dicts and like lists too"},
+    {NULL, NULL, 0, NULL}};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT, "_speedups",
+    "C implementation of the hot walks of nested_lookup", -1, speedups_methods};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    return PyModule_Create(&speedups_module);
+}
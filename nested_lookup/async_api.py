@@ -0,0 +1,150 @@
+import asyncio
+import functools
+from collections import defaultdict
+from itertools import islice
+
+from .lookup_api import (
+    _CopyOnWrite,
+    _check_in_place,
+    _update_items,
+    _update_values,
+    _write_updates,
+    nested_update,
+)
+from .nested_lookup import (
+    _key_matcher,
+    _match_items,
+    _pruner,
+    nested_lookup,
+)
+from .walker import walk
+
+# number of items walked between two yields to the event loop
+YIELD_EVERY = 10000
+
+
+async def anested_lookup(
+    key,
+    document,
+    wild=False,
+    with_keys=False,
+    with_paths=False,
+    max_depth=None,
+    prune=None,
+    limit=None,
+    yield_every=YIELD_EVERY,
+    offload=False,
+    executor=None,
+):
+    """
+    Lookup a key in a nested document without blocking the event loop.
+
+    Takes the same arguments as nested_lookup. The document is walked
+    yield_every items at a time, handing control back to the event loop
+    in between, so other tasks keep running while a large document is
+    searched. The document must not be modified until the lookup is done.
+
+    Args:
+        yield_every: Number of items walked between two yields to the loop
+        offload: Run the whole lookup in an executor instead
+        executor: Executor to offload to, defaults to the loop's executor
+    Return:
+        The result of nested_lookup
+    """
+    if offload or executor is not None:
+        return await _run_in_executor(
+            executor,
+            nested_lookup,
+            key,
+            document,
+            wild=wild,
+            with_keys=with_keys,
+            with_paths=with_paths,
+            max_depth=max_depth,
+            prune=prune,
+            limit=limit,
+        )
+
+    match = _key_matcher(key, wild)
+    items = walk(
+        document, with_paths=with_paths, prune=_pruner(prune), max_depth=max_depth
+    )
+    results = []
+    for chunk in _chunks(items, yield_every):
+        results.extend(_match_items(chunk, key, match, with_keys, with_paths))
+        if limit is not None and len(results) >= limit:
+            del results[limit:]
+            break
+        await asyncio.sleep(0)
+
+    if with_keys:
+        d = defaultdict(list)
+        for k, v in results:
+            d[k].append(v)
+        return d
+    return results
+
+
+async def anested_update(
+    document,
+    key,
+    value,
+    in_place=False,
+    treat_as_element=True,
+    yield_every=YIELD_EVERY,
+    offload=False,
+    executor=None,
+):
+    """
+    Update a key in a nested document without blocking the event loop.
+
+    Takes the same arguments as nested_update, and yield_every, offload and
+    executor like anested_lookup. The document must not be modified by
+    anyone else until the update is done.
+
+    Return:
+        The result of nested_update
+    """
+    if offload or executor is not None:
+        return await _run_in_executor(
+            executor,
+            nested_update,
+            document,
+            key,
+            value,
+            in_place=in_place,
+            treat_as_element=treat_as_element,
+        )
+
+    values = {key: _update_values(value, treat_as_element)}
+    if in_place:
+        _check_in_place(document)
+    writer = None if in_place else _CopyOnWrite(document)
+    # (dict, key) pairs of the updates in place, written once all are found
+    pairs = []
+    items = walk(document, with_paths=not in_place)
+    for chunk in _chunks(items, yield_every):
+        if in_place:
+            pairs.extend((parent, k) for parent, k, _ in chunk if k in values)
+        else:
+            _update_items(chunk, values, writer)
+        await asyncio.sleep(0)
+    if in_place:
+        _write_updates(pairs, values)
+        return document
+    return writer.result()
+
+
+def _chunks(items, size):
+    """yield lists of the next size items until the items run out"""
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_in_executor(executor, function, *args, **kwargs):
+    """run the function in the executor of the running event loop"""
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(executor, functools.partial(function, *args, **kwargs))
@@ -0,0 +1,71 @@
+import multiprocessing
+
+from .nested_lookup import nested_lookup
+
+# below this many documents the pool costs more than it saves
+MIN_PARALLEL = 1000
+
+
+def nested_lookup_batch(
+    key,
+    documents,
+    workers=None,
+    chunksize=None,
+    min_parallel=MIN_PARALLEL,
+    executor=None,
+    **kwargs
+):
+    """
+    Lookup a key in every document of a batch, spread over a process pool.
+
+    Documents are sent to the workers in chunks, so pickling is paid per
+    chunk rather than per document. Small batches (and Pythons without
+    concurrent.futures) are looked up serially, as starting the pool
+    and pickling the documents would cost more than it saves.
+
+    Args:
+        key: Key to search for
+        documents: List of nested documents
+        workers: Number of worker processes, defaults to the number of CPUs
+        chunksize: Number of documents per chunk, defaults to spreading
+            the batch over four chunks per worker
+        min_parallel: Smallest batch looked up in parallel
+        executor: Optional concurrent.futures executor to use instead of
+            starting a new pool, to share one pool between batches
+        kwargs: Keyword arguments of nested_lookup, which must be picklable
+    Return:
+        List of the nested_lookup results, in the order of the documents
+    """
+    documents = list(documents)
+    if executor is None and (workers == 1 or len(documents) < min_parallel):
+        return _lookup_chunk(key, documents, kwargs)
+
+    if executor is None:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            return _lookup_chunk(key, documents, kwargs)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return _lookup_chunks(executor, key, documents, workers, chunksize, kwargs)
+    return _lookup_chunks(executor, key, documents, workers, chunksize, kwargs)
+
+
+def _lookup_chunks(executor, key, documents, workers, chunksize, kwargs):
+    """lookup the key in chunks of the documents with the executor"""
+    if not chunksize:
+        workers = workers or multiprocessing.cpu_count()
+        chunksize = max(1, -(-len(documents) // (workers * 4)))
+    chunks = [
+        documents[start : start + chunksize]
+        for start in range(0, len(documents), chunksize)
+    ]
+    futures = [executor.submit(_lookup_chunk, key, chunk, kwargs) for chunk in chunks]
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
+
+
+def _lookup_chunk(key, documents, kwargs):
+    """lookup the key in every document of a chunk"""
+    return [nested_lookup(key, document, **kwargs) for document in documents]
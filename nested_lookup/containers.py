@@ -0,0 +1,101 @@
+from six import binary_type, iteritems, string_types, text_type
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .persistent import PersistentMap, PersistentVector
+
+# strings are sequences of strings, walking them would never end
+_STRINGS = string_types + (text_type, binary_type, bytearray)
+
+# (type, (mapping, children)) in the order of registration, the last
+# registered type an instance is a subclass of wins
+_registry = [
+    (dict, (True, iteritems)),
+    (list, (False, enumerate)),
+    (PersistentMap, (True, PersistentMap.iteritems)),
+    (PersistentVector, (False, enumerate)),
+]
+_DEFAULT_REGISTRY = list(_registry)
+
+# True while only the types above are registered, the C speedups walk them
+default_registry = True
+
+
+# type -> (mapping, children) handler, or None for the types which are
+# not containers. The handler of a type is looked up in the registry once,
+# the walk only pays a dict lookup per value.
+dispatch = {}
+
+
+def handler_of(cls):
+    """return the handler of a type, looking it up in the registry once"""
+    try:
+        return dispatch[cls]
+    except KeyError:
+        pass
+    handler = None
+    if not issubclass(cls, _STRINGS):
+        for registered, registered_handler in reversed(_registry):
+            if issubclass(cls, registered):
+                handler = registered_handler
+                break
+    dispatch[cls] = handler
+    return handler
+
+
+def register_container(cls, children=None, mapping=None):
+    """
+    Register how to walk the instances of a type (and of its subclasses),
+    so every function of nested_lookup looks into them like into dicts
+    and lists. dict, list and the persistent types of freeze are
+    registered from the start.
+
+        register_container(tuple)
+        register_container(collections.abc.Mapping)
+        register_container(LazyRecord, children=LazyRecord.iter_fields)
+
+    Args:
+        cls: Type to walk, abstract base classes work too
+        children: Function returning an iterator of the (key, value)
+            pairs of an instance, defaults to the items of mappings and
+            the (index, element) pairs of other types
+        mapping: Whether the instances are walked like dicts (the pairs
+            are keys and values) or like lists (indexes and elements),
+            defaults to whether cls is a Mapping
+    Hint: the update and delete functions write with item assignment and
+        deletion, and when not in place replace the containers on the path
+        to a write with their copy.copy (tuples and namedtuples are
+        rebuilt), so other immutable types can not be written through.
+    """
+    if mapping is None:
+        mapping = issubclass(cls, Mapping)
+    if children is None:
+        children = iteritems if mapping else enumerate
+    global default_registry
+    unregister_container(cls)
+    _registry.append((cls, (bool(mapping), children)))
+    dispatch.clear()
+    default_registry = _registry == _DEFAULT_REGISTRY
+
+
+def unregister_container(cls):
+    """Stop walking the instances of a registered type"""
+    global default_registry
+    _registry[:] = [entry for entry in _registry if entry[0] is not cls]
+    dispatch.clear()
+    default_registry = _registry == _DEFAULT_REGISTRY
+
+
+def is_mapping(value):
+    """return True if the value is walked like a dict"""
+    handler = handler_of(type(value))
+    return handler is not None and handler[0]
+
+
+def is_sequence(value):
+    """return True if the value is walked like a list"""
+    handler = handler_of(type(value))
+    return handler is not None and not handler[0]
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from .containers import handler_of, is_mapping
+from .matchers import Matcher, make_matcher
+from .nested_lookup import get_occurrence_of_value, nested_find_values
+from .walker import walk, build_path
+
+
+class NestedIndex(object):
+    """
+    Index of a nested document for answering many lookups on it.
+
+    The document is walked once to map every key to the paths and values
+    where it occurs (and every hashable value to the paths where it occurs),
+    after which lookups only cost the number of matches.
+
+    The index does not notice when the document is mutated, call refresh()
+    after changing it.
+
+    Args:
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self.refresh()
+
+    def refresh(self, document=None):
+        """
+        Rebuild the index, for the given document if one is provided
+        """
+        if document is not None:
+            self.document = document
+        keys = defaultdict(list)
+        values = defaultdict(list)
+        all_keys = []
+        walker = walk(self.document, with_lists=True, with_paths=True)
+        for position, (parent, key, value, node) in enumerate(walker):
+            path = build_path(node, key)
+            if is_mapping(parent):
+                keys[key].append((position, path, value))
+                all_keys.append(key)
+            elif is_mapping(value):
+                continue
+            try:
+                values[value].append((parent, key, value, path))
+            except TypeError:
+                # unhashable values are only found by a full scan
+                pass
+        self._keys = keys
+        self._values = values
+        self._all_keys = all_keys
+
+    def _entries(self, key, wild=False):
+        """return the (position, path, value) entries of the key"""
+        if not wild and not isinstance(key, Matcher):
+            try:
+                return self._keys.get(key, [])
+            except TypeError:
+                return []
+        match = make_matcher(key, wild)
+        entries = []
+        for k, matches in self._keys.items():
+            if match(k):
+                entries.extend(matches)
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def lookup(self, key, wild=False, with_keys=False, with_paths=False):
+        """
+        Lookup a key in the indexed document, like nested_lookup.
+
+        Args:
+            with_paths: Return (path, value) pairs instead of values
+        Return:
+            List of values (or a dict of key -> values with with_keys)
+        """
+        entries = self._entries(key, wild=wild)
+        if with_keys:
+            d = defaultdict(list)
+            for _, path, value in entries:
+                d[path[-1]].append((path, value) if with_paths else value)
+            return d
+        if with_paths:
+            return [(path, value) for _, path, value in entries]
+        return [value for _, _, value in entries]
+
+    def paths(self, key, wild=False):
+        """Return the paths of every occurrence of the key"""
+        return [path for _, path, _ in self._entries(key, wild=wild)]
+
+    def get_occurrence_of_key(self, key):
+        """Number of occurrences of the key, like get_occurrence_of_key"""
+        return sum(1 for _, _, value in self._entries(key) if value is not None)
+
+    def get_occurrence_of_value(self, value):
+        """Number of occurrences of the value, like get_occurrence_of_value"""
+        try:
+            return len(self._values.get(value, []))
+        except TypeError:
+            return get_occurrence_of_value(self.document, value)
+
+    def paths_of_value(self, value):
+        """Return the paths of every occurrence of a hashable value"""
+        return [entry[3] for entry in self._values.get(value, [])]
+
+    def find_values(self, value, with_paths=True):
+        """
+        Find the scalars equal to a value, or for which a predicate is
+        true, like nested_find_values. Hashable values only cost the
+        number of matches, predicates and unhashable values walk the
+        document.
+
+        Return:
+            List of what nested_find_values yields
+        """
+        if callable(value):
+            return list(nested_find_values(value, self.document, with_paths))
+        try:
+            entries = self._values.get(value, [])
+        except TypeError:
+            return list(nested_find_values(value, self.document, with_paths))
+        return [
+            entry if with_paths else entry[:3]
+            for entry in entries
+            if handler_of(type(entry[2])) is None
+        ]
+
+    def get_all_keys(self):
+        """Return all keys of the indexed document, like get_all_keys"""
+        return list(self._all_keys)
@@ -0,0 +1,154 @@
+import json
+import mmap
+import multiprocessing
+from collections import deque
+
+from .nested_lookup import nested_lookup, get_occurrence_of_key, get_occurrence_of_value
+
+# bytes of the file parsed by one task
+SHARD_SIZE = 64 * 1024 * 1024
+
+
+def scan_jsonl(
+    path,
+    key,
+    workers=None,
+    wild=False,
+    count=False,
+    shard_size=SHARD_SIZE,
+    executor=None,
+):
+    """
+    Lookup a key in every record of a JSON Lines file, in parallel.
+
+    The file is memory mapped and split into shards of about shard_size
+    bytes on line boundaries. Every shard is parsed and searched by a
+    worker process which maps the file itself, so only the matched values
+    travel back to the caller and no shard is ever read by the caller.
+
+    Args:
+        path: Path of the JSON Lines file, one JSON document per line
+        key: Key to search for, must be picklable
+        workers: Number of worker processes, defaults to the number of
+            CPUs, 1 scans the file in this process
+        wild: Match keys like nested_lookup does with wild
+        count: Count the occurrences like get_occurrence_of_key instead
+        shard_size: Approximate number of bytes per shard
+        executor: Optional concurrent.futures executor to use instead of
+            starting a new pool
+    Return:
+        Iterator of the values of the key, record after record in the
+        order of the file, which keeps at most a few shards of results in
+        memory. With count the number of occurrences (Integer)
+    """
+    if count:
+        return sum(_scan(path, "count_key", key, wild, workers, shard_size, executor))
+    return _flatten(_scan(path, "lookup", key, wild, workers, shard_size, executor))
+
+
+def count_jsonl_value(path, value, workers=None, shard_size=SHARD_SIZE, executor=None):
+    """
+    Count the occurrences of a value in every record of a JSON Lines file,
+    like get_occurrence_of_value, in parallel. Takes the arguments of
+    scan_jsonl.
+
+    Return:
+        Number of occurrence (Integer)
+    """
+    return sum(_scan(path, "count_value", value, False, workers, shard_size, executor))
+
+
+def _flatten(results):
+    for values in results:
+        for value in values:
+            yield value
+
+
+def _shards(path, shard_size):
+    """return the (start, end) byte ranges of the shards of the file"""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can not be mapped
+            return []
+        try:
+            size = len(data)
+            shards = []
+            start = 0
+            while start < size:
+                end = data.find(b"\n", min(start + shard_size, size) - 1)
+                end = size if end == -1 else end + 1
+                shards.append((start, end))
+                start = end
+            return shards
+        finally:
+            data.close()
+
+
+def _scan(path, operation, arg, wild, workers, shard_size, executor):
+    """yield the result of the operation on every shard, in file order"""
+    shards = _shards(path, shard_size)
+    if executor is None and (workers == 1 or len(shards) < 2):
+        for start, end in shards:
+            yield _scan_shard(path, start, end, operation, arg, wild)
+        return
+
+    if executor is None:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            for start, end in shards:
+                yield _scan_shard(path, start, end, operation, arg, wild)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in _submit(
+                executor, path, shards, operation, arg, wild, workers
+            ):
+                yield result
+        return
+    for result in _submit(executor, path, shards, operation, arg, wild, workers):
+        yield result
+
+
+def _submit(executor, path, shards, operation, arg, wild, workers):
+    """
+    scan the shards with the executor, keeping two shards per worker in
+    flight so the results are not piling up faster than they are consumed
+    """
+    in_flight = 2 * (workers or multiprocessing.cpu_count())
+    futures = deque()
+    for start, end in shards:
+        futures.append(
+            executor.submit(_scan_shard, path, start, end, operation, arg, wild)
+        )
+        if len(futures) >= in_flight:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def _scan_shard(path, start, end, operation, arg, wild):
+    """run the operation on the records of the lines from start to end"""
+    if operation == "lookup":
+        result = []
+    else:
+        result = 0
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data.seek(start)
+            while data.tell() < end:
+                line = data.readline().strip()
+                if not line:
+                    continue
+                record = json.loads(line.decode("utf-8"))
+                if operation == "lookup":
+                    result.extend(nested_lookup(arg, record, wild=wild))
+                elif operation == "count_key":
+                    result += get_occurrence_of_key(record, arg, wild=wild)
+                else:
+                    result += get_occurrence_of_value(record, arg)
+        finally:
+            data.close()
+    return result
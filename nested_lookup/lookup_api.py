@@ -1,36 +1,437 @@
 import copy
 import warnings
+
 from six import iteritems
-from nested_lookup import nested_lookup
 
+from . import speedups
+from .containers import dispatch, handler_of, is_mapping
+from .matchers import Matcher, make_matcher
+from .persistent import PersistentMap, PersistentVector
+from .persistent import _MapEvolver, _VectorEvolver
+from .stats import counted, current_stats, deepcopy
+from .walker import _CYCLE_CHECK_DEPTH, _check_cycle, _only_scalars, walk
+
+# persistent containers are never modified, they are written through
+# their evolvers
+_PERSISTENT = (PersistentMap, PersistentVector)
+_EVOLVERS = (_MapEvolver, _VectorEvolver)
+
+
+class _TupleWriter(list):
+    """writable stand-in of a tuple, persistent() returns the new tuple"""
+
+    def __init__(self, original):
+        list.__init__(self, original)
+        self.type = type(original)
+
+    def persistent(self):
+        """Return the tuple (or namedtuple) of the written items"""
+        if hasattr(self.type, "_make"):
+            return self.type._make(self)
+        return self.type(self)
+
+
+# the written containers which are turned into their new versions once
+# written
+_BUILDERS = _EVOLVERS + (_TupleWriter,)
+
+
+class _CopyOnWrite(object):
+    """
+    Copy of a document which shares its containers with the original
+    document until they are written to.
+
+    Writes go through container(), which makes shallow copies of the
+    containers on the path to the written one, so a modified document only
+    costs the branches that were modified and shares every other subtree.
+    Persistent containers are not copied but written through an evolver,
+    and tuples through a list, current() and result() turn them into their
+    new versions.
+    """
+
+    def __init__(self, document):
+        # id of copy -> copy, for every container written
+        self.written = {}
+        # whether containers were written through evolvers or tuple writers
+        self.built = False
+        self.document = self._writable(document)
+        # id of original container -> its copy, shared by all the paths to
+        # the container like the memo of copy.deepcopy
+        self.copies = {id(document): self.document}
+        # id of path node -> copy of its container, or None when the
+        # container was removed from or replaced in the copy
+        self.nodes = {}
+        # the path nodes of self.nodes, kept so their ids are not reused
+        self.kept = []
+
+    def _writable(self, original):
+        if isinstance(original, _PERSISTENT):
+            self.built = True
+            written = original.evolver()
+        elif isinstance(original, tuple):
+            self.built = True
+            written = _TupleWriter(original)
+        else:
+            written = copy.copy(original)
+        self.written[id(written)] = written
+        return written
+
+    @staticmethod
+    def _assignable(written):
+        """raise TypeError for the copies which can not be written to"""
+        if not hasattr(written, "__setitem__"):
+            raise TypeError(
+                "can not write into %s containers, they do not support item "
+                "assignment" % type(written).__name__
+            )
+        return written
+
+    def container(self, node):
+        """
+        Return the writable copy of the container of a path node
+        (as given by walk with with_paths), or None if the container was
+        removed from or replaced in the copy.
+
+        The document is walked depth first, so a container is only written
+        after the items leading to it: a copy stays in place once made and
+        a detached container stays detached. A container found on many
+        paths is copied once, and the copy is put on every path, it is
+        written to even through the paths which were detached.
+        """
+        nodes = self.nodes
+        chain = []
+        while id(node) not in nodes:
+            if node[0] is None:
+                # the node of the document itself
+                nodes[id(node)] = self._assignable(self.document)
+                self.kept.append(node)
+                break
+            chain.append(node)
+            node = node[0]
+        current = nodes[id(node)]
+        for child_node in reversed(chain):
+            _, key, original = child_node
+            child = None
+            if current is not None:
+                try:
+                    child = current[key]
+                except (KeyError, IndexError):
+                    pass
+            written = self.copies.get(id(original))
+            if child is original:
+                if written is None:
+                    written = self._assignable(self._writable(original))
+                    self.copies[id(original)] = written
+                current[key] = child = written
+            else:
+                # a container copied on another path is still written to
+                # when this path was detached, like the copy of a deepcopy
+                child = written
+            nodes[id(child_node)] = current = child
+            self.kept.append(child_node)
+        return current
+
+    def current(self, container):
+        """
+        Return the written version of a container of the document, the
+        walk must be done with it
+        """
+        written = self.copies.get(id(container))
+        if written is None:
+            return container
+        if not self.built:
+            return written
+        return self._persist(written, False)
+
+    def result(self):
+        """Return the written document, once all writes are done"""
+        if not self.built:
+            return self.document
+        return self._persist(self.document, True)
+
+    def _written_items(self, written):
+        if isinstance(written, _EVOLVERS):
+            return written.changes()
+        return handler_of(type(written))[1](written)
+
+    def _persist(self, written, final):
+        """
+        Return a written container with the evolvers and tuple writers in
+        it (and itself) turned into their new versions. The copies are only updated when
+        final, otherwise they are copied so later writes still go through
+        them.
+        """
+        # containers after the written containers in them
+        order = []
+        seen = set([id(written)])
+        stack = [(written, iter(self._written_items(written)))]
+        while stack:
+            container, items = stack[-1]
+            for _, value in items:
+                if id(value) in self.written and id(value) not in seen:
+                    seen.add(id(value))
+                    stack.append((value, iter(self._written_items(value))))
+                    break
+            else:
+                stack.pop()
+                order.append(container)
+
+        done = {}
+        for container in order:
+            changed = [
+                (key, done[id(value)])
+                for key, value in self._written_items(container)
+                if id(value) in done and done[id(value)] is not value
+            ]
+            persisted = container
+            if changed and not final:
+                persisted = copy.copy(container)
+            for key, value in changed:
+                persisted[key] = value
+            if isinstance(persisted, _BUILDERS):
+                persisted = persisted.persistent()
+            done[id(container)] = persisted
+        return done[id(written)]
+
+
+# containers copied by _deepcopy, everything else is left to copy.deepcopy
+_DEEP_COPIED = (dict, list, tuple)
+
+
+def _deepcopy(document):
+    """
+    copy.deepcopy with an explicit stack, so the depth of the document is
+    bounded only by memory. Dicts, lists and tuples are copied here (the
+    keys of the dicts are kept), their other values by copy.deepcopy with
+    the same memo.
+    """
+    memo = {}
+    # ids of the tuples being copied, a tuple found inside itself is left
+    # to copy.deepcopy
+    building = set()
+    holder = [None]
+    # (original, its items, copy, parent copy, key) of the containers being
+    # copied, tuples are copied into a list and built once done
+    stack = [(None, enumerate((document,)), holder, None, None)]
+    while stack:
+        original, items, copied, parent, key = stack[-1]
+        for child_key, value in items:
+            if type(value) not in _DEEP_COPIED or id(value) in building:
+                copied[child_key] = copy.deepcopy(value, memo)
+                continue
+            if id(value) in memo:
+                copied[child_key] = memo[id(value)]
+                continue
+            if type(value) is tuple:
+                building.add(id(value))
+                child = list(value)
+            else:
+                child = memo[id(value)] = copy.copy(value)
+                copied[child_key] = child
+            children = iteritems(value) if type(value) is dict else enumerate(value)
+            stack.append((value, children, child, copied, child_key))
+            break
+        else:
+            stack.pop()
+            if type(original) is tuple:
+                building.discard(id(original))
+                if id(original) in memo:
+                    built = memo[id(original)]
+                elif all(a is b for a, b in zip(copied, original)):
+                    built = original
+                else:
+                    built = tuple(copied)
+                memo[id(original)] = parent[key] = built
+    return holder[0]
+
+
+def _check_in_place(document):
+    """
+    raise TypeError for the documents, and the containers in them, which
+    can not be written in place
+    """
+    if isinstance(document, _PERSISTENT):
+        raise TypeError(
+            "persistent containers can not be modified in place, "
+            "use in_place=False to get their new version"
+        )
+
+
+def nested_delete(document, key, in_place=False, wild=False):
+    """
+    Method to delete a key->value pair from a nested document
+    Args:
+        document: Might be List of Dicts (or) Dict of Lists (or)
+         Dict of List of Dicts etc...
+        key: Key to delete, a Matcher, or a set (or list) of them to
+            delete all at once
+        in_place (bool):
+            True: modify the dict in place;
+            False: return a copy of the dict with the key deleted, which
+                shares all the unmodified parts with the dict
+            Defaults to False
+        wild: Delete the keys matching the key(s) like nested_lookup
+            does with wild
+    Return:
+        Returns a document that includes everything but the given key
+    """
+    return _nested_delete(document=document, key=key, in_place=in_place, wild=wild)
+
+
+def _delete_matcher(key, wild):
+    """
+    return a function giving the keys of a dict to delete, and a function
+    telling whether a key is deleted
+    """
+    keys = key if isinstance(key, (set, frozenset, list)) else [key]
+    if wild or any(isinstance(k, Matcher) for k in keys):
+        matchers = [make_matcher(k, wild) for k in keys]
+        if len(matchers) == 1:
+            match = matchers[0]
+        else:
+
+            def match(dict_key):
+                return any(m(dict_key) for m in matchers)
+
+        def doomed(container):
+            return [dict_key for dict_key in container if match(dict_key)]
+
+        return doomed, match
+
+    keys = frozenset(keys)
 
-def nested_delete(document, key, in_place=False):
-    if not in_place:
-        document = copy.deepcopy(document)
-    return _nested_delete(document=document, key=key)
+    def doomed(container):
+        if len(keys) <= len(container):
+            return [k for k in keys if k in container]
+        return [dict_key for dict_key in container if dict_key in keys]
 
+    def match(dict_key):
+        return dict_key in keys
 
-def _nested_delete(document, key):
+    return doomed, match
+
+
+def _nested_delete(document, key, in_place=True, wild=False):
     """
     Method to delete a key->value pair from a nested document
     Args:
         document: Might be List of Dicts (or) Dict of Lists (or)
          Dict of List of Dicts etc...
-        key: Key to delete
+        key: Key to delete, a Matcher, or a set (or list) of them
+        in_place (bool): modify the document or copy on write
+        wild: match the keys like nested_lookup does with wild
     Return:
         Returns a document that includes everything but the given key
     """
-    if isinstance(document, list):
-        for list_items in document:
-            _nested_delete(document=list_items, key=key)
-    elif isinstance(document, dict):
-        if key in document:
-            del document[key]
-        for dict_key, dict_value in iteritems(document):
-            _nested_delete(document=dict_value, key=key)
+    if in_place:
+        _check_in_place(document)
+        if not (wild or isinstance(key, (set, frozenset, list, Matcher))):
+            core = speedups.fast()
+            if core is not None:
+                core.delete(document, key)
+                return document
+
+    doomed, match = _delete_matcher(key, wild)
+
+    def prune(dict_key, dict_value):
+        return match(dict_key)
+
+    deleted = [0]
+    if in_place and current_stats() is None:
+        _delete_pairs(_doomed_pairs(document, doomed))
+        return document
+    if in_place:
+        # dict and key after key of the keys to delete, deleted once the
+        # walk found them all
+        pairs = []
+
+        def enter(container):
+            if is_mapping(container):
+                for dict_key in doomed(container):
+                    pairs.append(container)
+                    pairs.append(dict_key)
+
+        for _ in walk(document, enter=enter, prune=prune):
+            pass
+        deleted[0] = _delete_pairs(pairs)
+    else:
+        writer = _CopyOnWrite(document)
+        items = walk(document, with_paths=True, prune=prune)
+        for _, dict_key, _, node in counted(items, "keys_compared"):
+            if match(dict_key):
+                deleted[0] += 1
+                parent = writer.container(node)
+                if parent is not None and dict_key in parent:
+                    del parent[dict_key]
+        document = writer.result()
+
+    stats = current_stats()
+    if stats is not None:
+        stats.matches += deleted[0]
     return document
 
 
+def _doomed_pairs(document, doomed):
+    """
+    the dicts and keys to delete from a document without stats, dict and
+    key after key, the values of the keys are not walked: the loop of walk
+    with the keys found in it, like _lookup_all of nested_lookup
+    """
+    handlers = dispatch
+    pairs = []
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, (), enumerate((document,)))]
+    while stack:
+        _, skipped, items = stack[-1]
+        for dict_key, value in items:
+            if skipped and dict_key in skipped:
+                continue
+            try:
+                handler = handlers[type(value)]
+            except KeyError:
+                handler = handler_of(type(value))
+            if handler is None:
+                continue
+            keys = ()
+            if handler[0]:
+                keys = doomed(value)
+                for k in keys:
+                    pairs.append(value)
+                    pairs.append(k)
+            elif _only_scalars(value):
+                continue
+            if len(stack) >= check_at:
+                _check_cycle(entry[0] for entry in stack)
+                check_at *= 2
+            stack.append((value, keys, handler[1](value)))
+            break
+        else:
+            stack.pop()
+    return pairs
+
+
+def _delete_pairs(pairs):
+    """
+    Delete the keys found by a walk in place from their containers, given
+    container and key after key, or nothing if any of the containers is
+    persistent
+
+    Return:
+        Number of keys deleted
+    """
+    containers = pairs[::2]
+    for container in containers:
+        if isinstance(container, _PERSISTENT):
+            _check_in_place(container)
+    deleted = 0
+    for container, dict_key in zip(containers, pairs[1::2]):
+        # a container found on several paths is found several times
+        if dict_key in container:
+            del container[dict_key]
+            deleted += 1
+    return deleted
+
+
 def nested_update(document, key, value, in_place=False, treat_as_element=True):
     """
     Method to update a key->value pair in a nested document
@@ -41,7 +442,8 @@ def nested_update(document, key, value, in_place=False, treat_as_element=True):
         value: Value to set
         in_place (bool):
             True: modify the dict in place;
-            False: create a deep copy of the dict and modify it
+            False: return a modified copy of the dict, which shares all
+                the unmodified parts with the dict
             Defaults to False
         treat_list_element (bool):
             True: if a list is provided as "value", the function trys
@@ -58,19 +460,48 @@ def nested_update(document, key, value, in_place=False, treat_as_element=True):
     # check if a list or scalar value is provided and create a list
     # from the scalar value
     # check the length of the list and provide it to _nested_update
+    value = _update_values(value, treat_as_element)
+    return _nested_update(document=document, key=key, value=value, in_place=in_place)
+
+
+def nested_update_many(updates, document, in_place=False, treat_as_element=True):
+    """
+    Method to update many key->value pairs in a nested document with a
+    single traversal, instead of calling nested_update once per key
+    Args:
+        updates (dict): Maps every key to update to its value, the values
+            are taken like the value of nested_update: with
+            treat_as_element False a list of values is spread over the
+            occurrences of its key
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+        in_place (bool):
+            True: modify the dict in place;
+            False: return a modified copy of the dict, which shares all
+                the unmodified parts with the dict
+            Defaults to False
+        treat_as_element (bool): Like in nested_update, for every value
+    Return:
+        Returns a document that has all the updated key, value pairs.
+    """
+    values = dict(
+        (key, _update_values(value, treat_as_element)) for key, value in updates.items()
+    )
+    return _nested_update_many(document=document, values=values, in_place=in_place)
+
+
+def _update_values(value, treat_as_element):
+    """return the list of values _nested_update takes"""
     if not treat_as_element and not isinstance(value, list):
         raise Exception(
             "The value must be a list when treat_as_element is False."
         )
     elif treat_as_element:
         value = [value]
-
-    if not in_place:
-        document = copy.deepcopy(document)
-    return _nested_update(document=document, key=key, value=value)
+    return value
 
 
-def _nested_update(document, key, value):
+def _nested_update(document, key, value, in_place=True):
     """
     Method to update a key->value pair in a nested document.
     If the number of passed values is less than the number of key matches
@@ -80,24 +511,141 @@ def _nested_update(document, key, value):
             Dict of List of Dicts etc...
         key (str): Key to update the value
         value (list): value(s) which should be used for replacement purpouse
+        in_place (bool): modify the document or copy on write
     Return:
         Returns a document that has updated key, value pair.
     """
-    if isinstance(document, list):
-        for list_items in document:
-            _nested_update(
-                document=list_items, key=key, value=value
-            )
-    elif isinstance(document, dict):
-        for dict_key, dict_value in iteritems(document):
-            if dict_key == key:
-                document[key] = value[0]
-                if len(value) > 1:
-                    value.pop(0)
-            _nested_update(
-                document=dict_value, key=key, value=value
-            )
-    return document
+    return _nested_update_many(document, {key: value}, in_place=in_place)
+
+
+def _nested_update_many(document, values, in_place=True):
+    """
+    Method to update many key->value pairs in a nested document in a
+    single walk, the values are the lists _nested_update takes
+    Args:
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+        values (dict): Maps the keys to update to their list of values
+        in_place (bool): modify the document or copy on write
+    Return:
+        Returns a document that has the updated key, value pairs.
+    """
+    if in_place:
+        _check_in_place(document)
+        core = speedups.fast()
+        if core is not None:
+            core.update(document, values)
+            return document
+        if current_stats() is None:
+            _update_all(document, values)
+            return document
+
+    writer = None if in_place else _CopyOnWrite(document)
+    items = counted(walk(document, with_paths=not in_place), "keys_compared")
+    updated = _update_items(items, values, writer)
+    stats = current_stats()
+    if stats is not None:
+        stats.matches += updated
+    return document if in_place else writer.result()
+
+
+def _update_all(document, values):
+    """
+    _update_items in place without stats: the loop of walk with the keys
+    updated in it, like _lookup_all of nested_lookup. The writes are
+    undone when the walk fails, on a persistent container holding a key
+    for instance, so nothing is left written.
+    """
+    handlers = dispatch
+    # dict, key and previous value of every write, one after the other so
+    # no tuple is kept (and tracked by the garbage collector) per write
+    undo = []
+    # the lists of values as they were, the writes take values from them
+    lists = dict((key, list(found)) for key, found in iteritems(values))
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, False, enumerate((document,)))]
+    try:
+        while stack:
+            parent, mapping, items = stack[-1]
+            for dict_key, value in items:
+                if mapping and dict_key in values:
+                    if isinstance(parent, _PERSISTENT):
+                        _check_in_place(parent)
+                    found = values[dict_key]
+                    parent[dict_key] = found[0]
+                    undo.append(parent)
+                    undo.append(dict_key)
+                    undo.append(value)
+                    if len(found) > 1:
+                        found.pop(0)
+                try:
+                    handler = handlers[type(value)]
+                except KeyError:
+                    handler = handler_of(type(value))
+                if handler is None:
+                    continue
+                if not handler[0] and _only_scalars(value):
+                    continue
+                if len(stack) >= check_at:
+                    _check_cycle(entry[0] for entry in stack)
+                    check_at *= 2
+                stack.append((value, handler[0], handler[1](value)))
+                break
+            else:
+                stack.pop()
+    except BaseException:
+        for i in range(len(undo) - 3, -1, -3):
+            undo[i][undo[i + 1]] = undo[i + 2]
+        for key, found in iteritems(lists):
+            values[key][:] = found
+        raise
+
+
+def _write_updates(pairs, values):
+    """
+    Set the keys of the (container, key) pairs found by a walk in place to
+    the next of their values, or nothing if any of the containers is
+    persistent
+    """
+    for parent, _ in pairs:
+        if isinstance(parent, _PERSISTENT):
+            _check_in_place(parent)
+    for parent, dict_key in pairs:
+        value = values[dict_key]
+        parent[dict_key] = value[0]
+        if len(value) > 1:
+            value.pop(0)
+
+
+def _update_items(items, values, writer=None):
+    """
+    Update the keys of values (a dict of key -> list of values) from the
+    items of a walk, in place or through a _CopyOnWrite writer (which
+    needs the items walked with paths)
+
+    Return:
+        Number of matching keys
+    """
+    if writer is None:
+        pairs = [
+            (parent, dict_key) for parent, dict_key, _ in items if dict_key in values
+        ]
+        _write_updates(pairs, values)
+        return len(pairs)
+
+    updated = 0
+
+    for _, dict_key, _, node in items:
+        if dict_key in values:
+            # keys of replaced values are still counted, like in place
+            updated += 1
+            value = values[dict_key]
+            parent = writer.container(node)
+            if parent is not None:
+                parent[dict_key] = value[0]
+            if len(value) > 1:
+                value.pop(0)
+    return updated
 
 
 def nested_alter(
@@ -126,11 +674,12 @@ def nested_alter(
             applied to every found value before it is passed to the
             "callback_function"
         wild_alter: Find matching elements via wild-match by the given keys
-            and alter those.
+            and alter those. Takes the same modes as wild in nested_lookup.
         HINT: Keep in mind that the wild-match might return unexpected types!
         in_place (bool):
             True: modify the dict in place;
-            False: create a deep copy of the dict and modify it
+            False: return a modified copy of the dict, which shares all
+                the unmodified parts with the dict
             Defaults to False
     Return:
         Returns a document that has updated key, value pair.
@@ -144,8 +693,6 @@ def nested_alter(
         key = [key]
         key_len = len(key)
 
-    if not in_place:
-        document = copy.deepcopy(document)
     return _nested_alter(
         document=document,
         keys=key,
@@ -159,26 +706,19 @@ def nested_alter(
 
 
 def _call_callback(
-    value_list, callback_function, function_parameters, conversion_function
+    value, callback_function, function_parameters, conversion_function
 ):
     """
     internal helper to call the callback function
     """
-    return_list = []
-    # loop over all values
-    for value in value_list:
-        # apply the conversion function
-        if conversion_function is not None:
-            value = conversion_function(value)
-        # if functions arguments are present, expand the list to variables
-        # via the magic operator *
-        if function_parameters:
-            trans_val = callback_function(value, *function_parameters)
-        else:
-            trans_val = callback_function(value)
-        # append the transformed element to the list
-        return_list.append(trans_val)
-    return return_list
+    # apply the conversion function
+    if conversion_function is not None:
+        value = conversion_function(value)
+    # if functions arguments are present, expand the list to variables
+    # via the magic operator *
+    if function_parameters:
+        return callback_function(value, *function_parameters)
+    return callback_function(value)
 
 
 def _nested_alter(
@@ -190,26 +730,123 @@ def _nested_alter(
     wild_alter,
     in_place,
     key_len,
+    copy_on_write=False,
 ):
 
+    writer = None
+    if in_place:
+        _check_in_place(document)
+    elif copy_on_write or isinstance(document, _PERSISTENT):
+        # persistent values can be shared, only the paths to the altered
+        # values are copied
+        writer = _CopyOnWrite(document)
+    else:
+        # the callback may modify the values it is given, so they can not
+        # be shared with the original document
+        document = deepcopy(document, _deepcopy)
+
     # return data if no callback_function is provided
     if callback_function is None:
         warnings.warn("Please provide a callback_function to nested_alter().")
         return document
 
-    # iterate over all given keys in the list
-    for key in keys:
-        # try to find the key:
-        findings = nested_lookup(key, document, with_keys=True, wild=wild_alter)
-        for k, v in findings.items():
-            v = _nested_alter(v, keys, callback_function, function_parameters, conversion_function, wild_alter, in_place, key_len)
-            trans_val = _call_callback(
-                v, callback_function, function_parameters, conversion_function
-            )
-            # use the transformed value and apply the update to the key
-            # (dont treat the lists as elements here)
-            document = nested_update(
-                document, k, trans_val, in_place=in_place, treat_as_element=False
-            )
+    # values of the keys which contain dicts or lists are altered after
+    # the walk left them, so the occurrences nested in them come first
+    pending = {}
+    # id -> container of the containers left, a container found on several
+    # paths is walked once and its values are altered once
+    left = {}
+    # (id of parent container, key) of the items altered
+    altered_items = set()
+    # (parent, key, value) of the alterations without a writer, made once
+    # the walk is done so nothing is written if a parent is persistent
+    writes = []
+
+    call = _call_callback
+    stats = current_stats()
+    if stats is not None:
+        timed_call = stats.timed(_call_callback, "callback_time")
+
+        def call(*args):
+            stats.matches += 1
+            return timed_call(*args)
+
+    if writer is None:
+
+        def alter(parent, key, value):
+            if (id(parent), key) in altered_items:
+                return
+            altered_items.add((id(parent), key))
+            writes.append((parent, key, value))
+
+    else:
+
+        def alter(node, key, value):
+            # the copy of a container is the same on every path to it, it
+            # is put on this path even when it was altered on another one
+            parent = writer.container(node)
+            if (id(node[2]), key) in altered_items:
+                return
+            altered_items.add((id(node[2]), key))
+            if parent is not None:
+                parent[key] = call(
+                    value, callback_function, function_parameters, conversion_function
+                )
 
+    def current(container):
+        return container if writer is None else writer.current(container)
+
+    def leave(container):
+        left[id(container)] = container
+        for parent, key in pending.pop(id(container), ()):
+            alter(parent, key, current(container))
+
+    matchers = None
+    if wild_alter or any(isinstance(k, Matcher) for k in keys):
+        matchers = [make_matcher(k, wild_alter) for k in keys]
+
+    if writer is None:
+        items = walk(document, leave=leave, once=True)
+    else:
+        # the path node of a parent stands for it, it is written to
+        # through the writer. The original document is walked, so the
+        # containers found on several paths are walked on every path for
+        # the writer to put their copy there.
+        items = (
+            (node, key, value)
+            for _, key, value, node in walk(document, leave=leave, with_paths=True)
+        )
+
+    for parent, key, value in counted(items, "keys_compared"):
+        if (key in keys) if matchers is None else any(match(key) for match in matchers):
+            if handler_of(type(value)) is None:
+                alter(parent, key, value)
+            elif id(value) in left:
+                # found again after the walk left it
+                alter(parent, key, current(value))
+            else:
+                pending.setdefault(id(value), []).append((parent, key))
+
+    if writer is not None:
+        return writer.result()
+    for parent, _, _ in writes:
+        if isinstance(parent, _PERSISTENT) and not in_place:
+            # the copy holds persistent containers, they are written
+            # through their evolvers
+            return _nested_alter(
+                document,
+                keys,
+                callback_function,
+                function_parameters,
+                conversion_function,
+                wild_alter,
+                in_place,
+                key_len,
+                copy_on_write=True,
+            )
+        _check_in_place(parent)
+    for parent, key, value in writes:
+        parent[key] = call(
+            value, callback_function, function_parameters, conversion_function
+        )
     return document
@@ -0,0 +1,136 @@
+import fnmatch
+import re
+
+from six import string_types
+
+# number of document keys a matcher remembers the result for
+_CACHE_SIZE = 4096
+
+
+class Matcher(object):
+    """
+    Decide whether a document key matches, for the wild lookups.
+
+    A matcher is prepared once per call (or once for many calls) and then
+    called with every key of the document. The result for string keys is
+    cached, as documents tend to repeat the same keys over and over.
+    Subclasses implement match().
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def __call__(self, key):
+        if not isinstance(key, string_types):
+            return self.match(key)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if len(self._cache) >= _CACHE_SIZE:
+            self._cache.clear()
+        result = self._cache[key] = self.match(key)
+        return result
+
+    def match(self, key):
+        """return True if the document key matches, else False"""
+        raise NotImplementedError
+
+
+class ExactMatcher(Matcher):
+    """Match the keys equal to the given key, like nested_lookup"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self, key):
+        return self.key == key
+
+    match = __call__
+
+
+class WildMatcher(Matcher):
+    """
+    Match the keys which contain the given key as a case insensitive
+    substring, like nested_lookup with wild=True
+    """
+
+    def __init__(self, key):
+        super(WildMatcher, self).__init__()
+        self.key = key
+        self.needle = str(key).lower()
+
+    def match(self, key):
+        return self.key == key or self.needle in str(key).lower()
+
+
+class GlobMatcher(Matcher):
+    """Match the keys against a shell style pattern like "user_*" """
+
+    def __init__(self, pattern, ignore_case=False):
+        super(GlobMatcher, self).__init__()
+        self.pattern = pattern
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regex = re.compile(fnmatch.translate(str(pattern)), flags)
+
+    def match(self, key):
+        return self.regex.match(str(key)) is not None
+
+
+class RegexMatcher(Matcher):
+    """Match the keys in which the regular expression finds a match"""
+
+    def __init__(self, pattern, flags=0):
+        super(RegexMatcher, self).__init__()
+        self.regex = re.compile(pattern, flags)
+
+    def match(self, key):
+        return self.regex.search(str(key)) is not None
+
+
+class PrefixMatcher(Matcher):
+    """Match the keys starting with the given prefix"""
+
+    def __init__(self, prefix, ignore_case=False):
+        super(PrefixMatcher, self).__init__()
+        self.ignore_case = ignore_case
+        self.prefix = str(prefix).lower() if ignore_case else str(prefix)
+
+    def match(self, key):
+        key = str(key)
+        if self.ignore_case:
+            key = key.lower()
+        return key.startswith(self.prefix)
+
+
+_WILD_MATCHERS = {
+    "substring": WildMatcher,
+    "glob": GlobMatcher,
+    "regex": RegexMatcher,
+    "prefix": PrefixMatcher,
+}
+
+
+def make_matcher(key, wild=False):
+    """
+    Method to prepare the matcher of a lookup
+    Args:
+        key: Key to search for, or a Matcher which is used as it is
+        wild: False to match equal keys; True (or "substring") to match
+            case insensitive substrings; "glob", "regex" or "prefix" to
+            use the key as a pattern of that kind
+    Return:
+        A Matcher to call with every key of the document
+    """
+    if isinstance(key, Matcher):
+        return key
+    if not wild:
+        return ExactMatcher(key)
+    if wild is True:
+        wild = "substring"
+    try:
+        return _WILD_MATCHERS[wild](key)
+    except KeyError:
+        raise ValueError(
+            "wild must be a bool or one of %s" % ", ".join(sorted(_WILD_MATCHERS))
+        )
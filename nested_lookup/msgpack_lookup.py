@@ -0,0 +1,247 @@
+import struct
+from collections import namedtuple
+
+from six import PY2, text_type
+
+from .matchers import Matcher, make_matcher
+from .nested_lookup import _match_items
+from .walker import walk
+
+# msgpack extension value, like msgpack.ExtType
+ExtType = namedtuple("ExtType", "code data")
+
+# kinds of the headers read by _header
+_SCALAR, _STR, _BIN, _EXT, _ARRAY, _MAP = range(6)
+
+# first byte -> (kind, struct of the value or length, size of the struct)
+_HEADERS = {
+    0xC4: (_BIN, struct.Struct(">B")),
+    0xC5: (_BIN, struct.Struct(">H")),
+    0xC6: (_BIN, struct.Struct(">I")),
+    0xC7: (_EXT, struct.Struct(">B")),
+    0xC8: (_EXT, struct.Struct(">H")),
+    0xC9: (_EXT, struct.Struct(">I")),
+    0xCA: (_SCALAR, struct.Struct(">f")),
+    0xCB: (_SCALAR, struct.Struct(">d")),
+    0xCC: (_SCALAR, struct.Struct(">B")),
+    0xCD: (_SCALAR, struct.Struct(">H")),
+    0xCE: (_SCALAR, struct.Struct(">I")),
+    0xCF: (_SCALAR, struct.Struct(">Q")),
+    0xD0: (_SCALAR, struct.Struct(">b")),
+    0xD1: (_SCALAR, struct.Struct(">h")),
+    0xD2: (_SCALAR, struct.Struct(">i")),
+    0xD3: (_SCALAR, struct.Struct(">q")),
+    0xD9: (_STR, struct.Struct(">B")),
+    0xDA: (_STR, struct.Struct(">H")),
+    0xDB: (_STR, struct.Struct(">I")),
+    0xDC: (_ARRAY, struct.Struct(">H")),
+    0xDD: (_ARRAY, struct.Struct(">I")),
+    0xDE: (_MAP, struct.Struct(">H")),
+    0xDF: (_MAP, struct.Struct(">I")),
+}
+_CONSTANTS = {0xC0: None, 0xC2: False, 0xC3: True}
+# fixext 1, 2, 4, 8 and 16
+_FIXEXT = {0xD4: 1, 0xD5: 2, 0xD6: 4, 0xD7: 8, 0xD8: 16}
+
+
+def nested_lookup_msgpack(key, buffer, wild=False, with_keys=False):
+    """
+    Lookup a key in a msgpack encoded document without decoding all of it.
+
+    The encoded document is scanned in place, only the values of the
+    matched keys are decoded, so looking up a few keys in a large document
+    costs a scan of its bytes instead of building all of its objects.
+    Values are yielded in the same order as nested_lookup, a value
+    containing other matches is yielded before them.
+
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            names = list(nested_lookup_msgpack("name", data))
+
+    Args:
+        key: Key to search for
+        buffer: bytes, bytearray, memoryview, mmap or any other object
+            supporting the buffer protocol, holding one msgpack object.
+            On Python 2 it is copied into a bytearray, as the items of its
+            memoryviews are strings rather than bytes.
+        wild: Match keys like nested_lookup does with wild
+        with_keys: Yield (key, value) pairs instead of values
+    Yield:
+        Every value (or (key, value) pair) of the key in the document,
+        binary values as bytes and extension values as ExtType
+    Raises:
+        ValueError: if the buffer does not hold valid msgpack
+    """
+    data = _bytes_view(buffer)
+    if wild or isinstance(key, Matcher):
+        match = make_matcher(key, wild)
+    else:
+        match = None
+    for k, v in _scan(data, key, match):
+        if with_keys:
+            yield k, v
+        else:
+            yield v
+
+
+def _bytes_view(buffer):
+    """return the bytes of a buffer, indexed as ints"""
+    if PY2:
+        # the items of memoryviews are strings on Python 2
+        return bytearray(buffer)
+    data = memoryview(buffer)
+    if data.ndim != 1 or data.itemsize != 1:
+        data = data.cast("B")
+    return data
+
+
+def _scan(data, key, match):
+    """
+    Scan the msgpack object in data, yield the (key, value) pairs of the
+    matching keys. match is the Matcher of the key or None to compare keys
+    with ==, string keys are then compared in their encoded form.
+    """
+    encoded = None
+    if match is None and isinstance(key, text_type):
+        encoded = key.encode("utf-8")
+    try:
+        # stack of [remaining items, is a map] of the containers scanned
+        stack = [[1, False]]
+        pos = 0
+        while stack:
+            frame = stack[-1]
+            if not frame[0]:
+                stack.pop()
+                continue
+            frame[0] -= 1
+            if frame[1]:
+                kind, arg, end = _header(data, pos)
+                if kind == _STR and encoded is not None:
+                    matched = data[arg:end] == encoded
+                    k = key
+                else:
+                    k, end = _decode(data, pos)
+                    matched = (key == k) if match is None else match(k)
+                pos = end
+                if matched:
+                    value, pos = _decode(data, pos)
+                    yield k, value
+                    # the matches nested in the value come from the value
+                    for item in _match_items(walk(value), key, match, True):
+                        yield item
+                    continue
+            kind, arg, end = _header(data, pos)
+            if kind == _ARRAY or kind == _MAP:
+                stack.append([arg, kind == _MAP])
+            pos = end
+    except (IndexError, struct.error):
+        raise ValueError("truncated msgpack data at byte %d" % pos)
+
+
+def _header(data, pos):
+    """
+    Read the header of the msgpack object at pos.
+
+    Return:
+        (kind, arg, end) where arg is the value of scalars, the position of
+        the bytes of strings and binaries, (code, position) of extensions
+        and the number of items of arrays and maps. end is the position
+        after the object, or after the header of arrays and maps.
+    """
+    b = data[pos]
+    if b <= 0x7F:
+        return _SCALAR, b, pos + 1
+    if b >= 0xE0:
+        return _SCALAR, b - 0x100, pos + 1
+    if b <= 0x8F:
+        return _MAP, b & 0x0F, pos + 1
+    if b <= 0x9F:
+        return _ARRAY, b & 0x0F, pos + 1
+    if b <= 0xBF:
+        start = pos + 1
+        return _STR, start, _end(data, start, b & 0x1F)
+    if b in _CONSTANTS:
+        return _SCALAR, _CONSTANTS[b], pos + 1
+    if b in _FIXEXT:
+        start = pos + 2
+        return _EXT, (_ext_code(data, pos + 1), start), _end(data, start, _FIXEXT[b])
+    try:
+        kind, fmt = _HEADERS[b]
+    except KeyError:
+        raise ValueError("invalid msgpack byte 0x%02x at byte %d" % (b, pos))
+    (arg,) = fmt.unpack_from(data, pos + 1)
+    start = pos + 1 + fmt.size
+    if kind == _SCALAR or kind == _ARRAY or kind == _MAP:
+        return kind, arg, start
+    if kind == _EXT:
+        return _EXT, (_ext_code(data, start), start + 1), _end(data, start + 1, arg)
+    return kind, start, _end(data, start, arg)
+
+
+def _end(data, start, length):
+    """return the end of length bytes at start, checking they are there"""
+    end = start + length
+    if end > len(data):
+        raise IndexError(end)
+    return end
+
+
+def _ext_code(data, pos):
+    code = data[pos]
+    return code - 0x100 if code >= 0x80 else code
+
+
+def _value(data, kind, arg, end):
+    """return the value of a header which is not an array or map"""
+    if kind == _STR:
+        return bytes(data[arg:end]).decode("utf-8")
+    if kind == _BIN:
+        return bytes(data[arg:end])
+    if kind == _EXT:
+        return ExtType(arg[0], bytes(data[arg[1] : end]))
+    return arg
+
+
+_NO_KEY = object()
+
+
+def _decode(data, pos):
+    """
+    Decode the msgpack object at pos with an explicit stack.
+
+    Return:
+        The object and the position after it
+    """
+    root = None
+    # stack of [container, remaining items, pending map key]
+    stack = []
+    while True:
+        kind, arg, pos = _header(data, pos)
+        if kind == _ARRAY:
+            value = []
+        elif kind == _MAP:
+            value = {}
+        else:
+            value = _value(data, kind, arg, pos)
+
+        if not stack:
+            root = value
+        else:
+            frame = stack[-1]
+            container = frame[0]
+            if isinstance(container, list):
+                container.append(value)
+                frame[1] -= 1
+            elif frame[2] is _NO_KEY:
+                frame[2] = value
+            else:
+                container[frame[2]] = value
+                frame[2] = _NO_KEY
+                frame[1] -= 1
+
+        if (kind == _ARRAY or kind == _MAP) and arg:
+            stack.append([value, arg, _NO_KEY])
+        while stack and not stack[-1][1]:
+            stack.pop()
+        if not stack:
+            return root, pos
@@ -1,86 +1,407 @@
-from six import iteritems
-
 from collections import defaultdict
+from itertools import islice
+
+from .containers import dispatch, handler_of, is_mapping, is_sequence
+from . import speedups
+from .matchers import Matcher, make_matcher
+from .stats import counted, current_stats
+from .walker import _CYCLE_CHECK_DEPTH, _check_cycle, _only_scalars
+from .walker import walk, build_path
+
+
+def nested_lookup(
+    key,
+    document,
+    wild=False,
+    with_keys=False,
+    with_paths=False,
+    max_depth=None,
+    prune=None,
+    limit=None,
+):
+    """
+    Lookup a key in a nested document, return a list of values
 
+    With with_paths every value comes as a (path, value) pair, where path
+    is the tuple of dict keys and list indexes leading to the value.
 
-values_list = []
+    wild=True matches the keys containing the key as a case insensitive
+    substring, wild="glob", "regex" or "prefix" uses the key as a pattern
+    of that kind, and a Matcher can be passed as the key itself.
 
+    max_depth limits the levels searched, the items of the document are at
+    level 0 and every dict and list adds a level. prune takes the keys (or
+    a function of key and value returning True) whose values are not
+    searched, their own value is still returned when they match.
 
-def nested_lookup(key, document, wild=False, with_keys=False):
-    """Lookup a key in a nested document, return a list of values"""
+    limit stops the search once that many values are found.
+    """
+    if not (wild or with_keys or with_paths or isinstance(key, Matcher)) and (
+        max_depth is None and prune is None and limit is None
+    ):
+        core = speedups.fast()
+        if core is not None:
+            return core.lookup(document, key)
+        if current_stats() is None:
+            return _lookup_all(key, document)
+
+    results = iter_nested_lookup(
+        key,
+        document,
+        wild=wild,
+        with_keys=with_keys,
+        with_paths=with_paths,
+        max_depth=max_depth,
+        prune=prune,
+    )
+    if limit is not None:
+        results = islice(results, limit)
     if with_keys:
         d = defaultdict(list)
-        for k, v in _nested_lookup(key, document, wild=wild, with_keys=with_keys):
+        for k, v in results:
             d[k].append(v)
         return d
-    return list(_nested_lookup(key, document, wild=wild, with_keys=with_keys))
+    return list(results)
 
 
-def _is_case_insensitive_substring(a, b):
-    """return True if `a` is a case insensitive substring of `b`, else False"""
-    return str(a).lower() in str(b).lower()
+def _lookup_all(key, document):
+    """
+    nested_lookup without options and without stats: the loop of walk
+    with the keys compared in it, without the hooks of walk and the
+    generators between the walk and the list of values
+    """
+    handlers = dispatch
+    values = []
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, False, enumerate((document,)))]
+    while stack:
+        _, mapping, items = stack[-1]
+        for k, value in items:
+            if mapping and key == k:
+                values.append(value)
+            try:
+                handler = handlers[type(value)]
+            except KeyError:
+                handler = handler_of(type(value))
+            if handler is None:
+                continue
+            if not handler[0] and _only_scalars(value):
+                # nothing to compare in there
+                continue
+            if len(stack) >= check_at:
+                _check_cycle(entry[0] for entry in stack)
+                check_at *= 2
+            stack.append((value, handler[0], handler[1](value)))
+            break
+        else:
+            stack.pop()
+    return values
+
+
+def _all_keys(document):
+    """get_all_keys without options and without stats, like _lookup_all"""
+    handlers = dispatch
+    keys = []
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, False, enumerate((document,)))]
+    while stack:
+        _, mapping, items = stack[-1]
+        for k, value in items:
+            if mapping:
+                keys.append(k)
+            try:
+                handler = handlers[type(value)]
+            except KeyError:
+                handler = handler_of(type(value))
+            if handler is None:
+                continue
+            if not handler[0] and _only_scalars(value):
+                continue
+            if len(stack) >= check_at:
+                _check_cycle(entry[0] for entry in stack)
+                check_at *= 2
+            stack.append((value, handler[0], handler[1](value)))
+            break
+        else:
+            stack.pop()
+    return keys
+
+
+def _count_value(value, document):
+    """
+    get_occurrence_of_value without stats, like _lookup_all: the items of
+    the dicts and lists equal to the value are counted, but for the dicts
+    in lists
+    """
+    handlers = dispatch
+    occurrence = 0
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, False, enumerate((document,)))]
+    while stack:
+        _, mapping, items = stack[-1]
+        for _, found in items:
+            try:
+                handler = handlers[type(found)]
+            except KeyError:
+                handler = handler_of(type(found))
+            if len(stack) > 1 and (found is value or found == value):
+                if mapping or handler is None or not handler[0]:
+                    occurrence += 1
+            if handler is None:
+                continue
+            if len(stack) >= check_at:
+                _check_cycle(entry[0] for entry in stack)
+                check_at *= 2
+            stack.append((found, handler[0], handler[1](found)))
+            break
+        else:
+            stack.pop()
+    return occurrence
+
+
+def _pruner(prune):
+    """
+    return the prune function for walk from a key, a set (or list) of
+    keys or a function
+    """
+    if prune is None or callable(prune):
+        return prune
+    keys = frozenset(prune if isinstance(prune, (set, frozenset, list)) else [prune])
+
+    def pruner(key, value):
+        return key in keys
+
+    return pruner
+
+
+def _key_matcher(key, wild):
+    """return the Matcher of a lookup, or None to compare keys with =="""
+    if wild is True and not isinstance(key, Matcher):
+        # a plain function over the lowered key, calling it costs less
+        # than calling a WildMatcher and looking up its cache
+        needle = str(key).lower()
+
+        def match(k):
+            return key == k or needle in str(k).lower()
+
+        return match
+    if wild or isinstance(key, Matcher):
+        return make_matcher(key, wild)
+    return None
+
+
+def iter_nested_lookup(
+    key,
+    document,
+    wild=False,
+    with_keys=False,
+    with_paths=False,
+    max_depth=None,
+    prune=None,
+):
+    """
+    Lookup a key in a nested document, yield the values lazily.
 
+    Takes the same arguments as nested_lookup. The document is only walked
+    as far as the values are consumed, so stopping early saves the rest of
+    the walk. With with_keys (key, value) pairs are yielded.
+    """
+    items = walk(
+        document, with_paths=with_paths, prune=_pruner(prune), max_depth=max_depth
+    )
+    items = counted(items, "keys_compared")
+    results = _match_items(items, key, _key_matcher(key, wild), with_keys, with_paths)
+    return counted(results, "matches")
 
-def _nested_lookup(key, document, wild=False, with_keys=False):
-    """Lookup a key in a nested document, yield a value"""
-    if isinstance(document, list):
-        for d in document:
-            for result in _nested_lookup(key, d, wild=wild, with_keys=with_keys):
-                yield result
 
-    if isinstance(document, dict):
-        for k, v in iteritems(document):
-            if key == k or (wild and _is_case_insensitive_substring(key, k)):
+def _match_items(items, key, match, with_keys=False, with_paths=False):
+    """
+    Yield the values of the matching keys from the items of a walk,
+    match is the Matcher of the key or None to compare keys with ==
+    """
+    if with_paths:
+        for _, k, v, node in items:
+            if (key == k) if match is None else match(k):
                 if with_keys:
-                    yield k, v
+                    yield k, (build_path(node, k), v)
                 else:
-                    yield v
-            if isinstance(v, dict):
-                for result in _nested_lookup(key, v, wild=wild, with_keys=with_keys):
-                    yield result
-            elif isinstance(v, list):
-                for d in v:
-                    for result in _nested_lookup(
-                        key, d, wild=wild, with_keys=with_keys
-                    ):
-                        yield result
+                    yield build_path(node, k), v
+        return
+
+    for _, k, v in items:
+        if (key == k) if match is None else match(k):
+            if with_keys:
+                yield k, v
+            else:
+                yield v
+
+
+_nested_lookup = iter_nested_lookup
+
+
+def nested_find_first(key, document, default=None, **kwargs):
+    """
+    Return the first value of a key in a nested document, or default when
+    the key is missing. Stops walking at the first match.
+
+    Takes the keyword arguments of nested_lookup, a limit other than 0
+    changes nothing as the walk stops at the first match anyway.
+    """
+    if kwargs.pop("limit", None) == 0:
+        return default
+    return next(iter_nested_lookup(key, document, **kwargs), default)
+
+
+def nested_contains(key, document, **kwargs):
+    """
+    Return True if a key occurs in a nested document, else False.
+    Stops walking at the first match.
+
+    Takes the keyword arguments of nested_lookup, like nested_find_first.
+    """
+    if kwargs.pop("limit", None) == 0:
+        return False
+    for _ in iter_nested_lookup(key, document, **kwargs):
+        return True
+    return False
+
+
+def nested_lookup_many(keys, document, wild=False, with_keys=False):
+    """
+    Lookup many keys in a nested document with a single traversal.
+
+    Args:
+        keys: List of keys to search for
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+        wild: Match keys like nested_lookup does with wild
+        with_keys: Group the values of each key by the matched document key
+    Return:
+        Dict which maps every given key to the list of values nested_lookup
+        returns for it, or to a dict of matched key -> values with with_keys
+    """
+    results = {}
+    for key in keys:
+        if key not in results:
+            results[key] = defaultdict(list) if with_keys else []
+    if wild or any(isinstance(key, Matcher) for key in results):
+        matcher = _wild_matcher(results, wild)
+    else:
+        matcher = _exact_matcher(results)
+    for key, k, v in counted(_nested_lookup_many(matcher, document), "matches"):
+        if with_keys:
+            results[key][k].append(v)
+        else:
+            results[key].append(v)
+    return results
+
+
+def _exact_matcher(keys):
+    """return a function mapping a document key to the equal searched keys"""
+    targets = dict((key, (key,)) for key in keys)
+
+    def matcher(k):
+        return targets.get(k, ())
+
+    return matcher
+
 
+def _wild_matcher(keys, wild):
+    """return a function mapping a document key to the searched keys
+    matching it"""
+    matchers = [(key, make_matcher(key, wild)) for key in keys]
 
-def get_all_keys(dictionary):
+    def matcher(k):
+        return [key for key, match in matchers if match(k)]
+
+    return matcher
+
+
+def _nested_lookup_many(matcher, document):
+    """Lookup many keys in a nested document, yield (key, matched key, value)"""
+    for _, k, v in counted(walk(document), "keys_compared"):
+        for key in matcher(k):
+            yield key, k, v
+
+
+def get_all_keys(dictionary, unique=False, with_depth=False, with_paths=False):
     """
         Method to get all keys from a nested dictionary as a List
         Args:
             dictionary: Nested dictionary
+            unique, with_depth, with_paths: like iter_all_keys
         Returns:
             List of keys in the dictionary
     """
-    result_list = []
+    if unique or with_depth or with_paths:
+        return list(iter_all_keys(dictionary, unique, with_depth, with_paths))
+    core = speedups.fast()
+    if core is not None:
+        return core.all_keys(dictionary)
+    if current_stats() is None:
+        return _all_keys(dictionary)
+    return [key for _, key, _ in walk(dictionary)]
 
-    def recrusion(document):
-        if isinstance(document, list):
-            for list_items in document:
-                recrusion(document=list_items)
-        elif isinstance(document, dict):
-            for key, value in iteritems(document):
-                result_list.append(key)
-                recrusion(document=value)
-        return
-
-    recrusion(document=dictionary)
-    return result_list
 
+def iter_all_keys(dictionary, unique=False, with_depth=False, with_paths=False):
+    """
+    Method to get all keys from a nested dictionary lazily, the keys are
+    yielded as the walk finds them so only what is kept costs memory
 
-def get_occurrence_of_key(dictionary, key):
+    Args:
+        dictionary: Nested dictionary
+        unique: Yield every key (or path, or pair with the depth) only
+            once, remembering the ones yielded in a set
+        with_depth: Yield (key, depth) pairs, the keys of the dictionary
+            are at depth 0 and every dict and list adds a level like for
+            max_depth in nested_lookup
+        with_paths: Yield the paths of the keys instead, the tuples of
+            dict keys and list indexes leading to (and ending with) them
+    Yield:
+        Keys in the dictionary, or their paths, with their depth when
+        with_depth is given
+    """
+    depth = [0]
+    enter = leave = None
+    if with_depth:
+
+        def enter(container):
+            depth[0] += 1
+
+        def leave(container):
+            depth[0] -= 1
+
+    seen = set()
+    for item in walk(dictionary, enter=enter, leave=leave, with_paths=with_paths):
+        result = build_path(item[3], item[1]) if with_paths else item[1]
+        if with_depth:
+            # the dictionary itself was entered too
+            result = (result, depth[0] - 1)
+        if unique:
+            if result in seen:
+                continue
+            seen.add(result)
+        yield result
+
+
+def get_occurrence_of_key(dictionary, key, with_paths=False, wild=False):
     """
     Method to get occurrence of a key in a nested dictionary
 
     Args:
         dictionary: Nested dictionary
-        key: Key to search for the occurrences
+        key: Key to search for the occurrences, or a Matcher
+        with_paths: Return the occurrences instead of counting them
+        wild: Match keys like nested_lookup does with wild
     Return:
-        Number of occurrence (Integer)
+        Number of occurrence (Integer), or with with_paths a list of
+        (path, value) pairs of the occurrences
     """
-    return _get_occurrence(dictionary=dictionary, item="key", keyword=key)
+    if with_paths:
+        return _get_occurrence_paths(
+            dictionary=dictionary, item="key", keyword=key, wild=wild
+        )
+    return _get_occurrence(dictionary=dictionary, item="key", keyword=key, wild=wild)
 
 
 def get_occurrences_and_values(items, value):
@@ -95,88 +416,164 @@ def get_occurrences_and_values(items, value):
         Dict where the key is the value arg and his value is a new
         dict with occurrences and values
     """
-    occurrences = {}
     occurrence = 0
     value_list = []
 
     for item in items:
-        occurrence_result, values = _get_occurrence_with_values(dictionary=item, item="value", keyword=value)
-        occurrence = occurrence + occurrence_result
-        if occurrence_result:
-            value_list.extend(values)
+        occurrence_result, values = _get_occurrence(
+            dictionary=item, item="value", keyword=value, with_values=True
+        )
+        occurrence += occurrence_result
+        value_list.extend(values)
 
-    occurrences[value] = {
-        'occurrences': occurrence,
-        'values': value_list
-    }
+    return {value: {"occurrences": occurrence, "values": value_list}}
 
-    return occurrences
 
+def nested_find_values(value, document, with_paths=True):
+    """
+    Find the scalars of a nested document equal to a value, or for which
+    a predicate is true, lazily in a single walk.
 
-def _get_occurrence_with_values(dictionary, item, keyword):
-    occurrence = [0]
+        urls = nested_find_values(RegexMatcher("^https?://"), document)
+        for parent, key, url, path in urls:
+            ...
 
-    result_recursion = _recursion(dictionary, item, keyword, occurrence, True)
+    Args:
+        value: Value to search for, or a function (like a Matcher) called
+            with every scalar and returning True for the matching ones
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+        with_paths: Also yield the path of every match
+    Yield:
+        (parent, key, value, path) for every matching scalar, parent is
+        the dict (or list) holding it and key its key (or index). Without
+        with_paths (parent, key, value)
+    """
+    items = walk(document, with_lists=True, with_paths=with_paths)
+    items = counted(items, "keys_compared")
+    return counted(_find_values(items, value, with_paths), "matches")
 
-    global values_list
-    values_list = []
 
-    return occurrence[0], result_recursion
+def _find_values(items, value, with_paths):
+    """yield the items of a walk holding matching scalars"""
+    match = value if callable(value) else None
+    for item in items:
+        found = item[2]
+        if handler_of(type(found)) is not None:
+            continue
+        if (found is value or found == value) if match is None else match(found):
+            if with_paths:
+                yield item[0], item[1], found, build_path(item[3], item[1])
+            else:
+                yield item
 
 
-def get_occurrence_of_value(dictionary, value):
+def get_occurrence_of_value(dictionary, value, with_paths=False):
     """
     Method to get occurrence of a value in a nested dictionary
 
     Args:
         dictionary: Nested dictionary
         value: Value to search for the occurrences
+        with_paths: Return the occurrences instead of counting them
     Return:
-        Number of occurrence (Integer)
+        Number of occurrence (Integer), or with with_paths a list of
+        (path, value) pairs of the occurrences
     """
+    if with_paths:
+        return _get_occurrence_paths(
+            dictionary=dictionary, item="value", keyword=value
+        )
     return _get_occurrence(dictionary=dictionary, item="value", keyword=value)
 
 
-def _recursion(dictionary, item, keyword, occurrence, with_values=False):
+def _get_occurrence(dictionary, item, keyword, wild=False, with_values=False):
+    """
+    Method to get occurrence of a key or value in a nested dictionary
 
-    global values_list
+    Counts in a single walk without any shared state, so it is safe to
+    call from many threads at once.
 
+    Args:
+        dictionary: Nested dictionary
+        item: Mostly (key or value)
+        keyword: key word to find occurrence
+        wild: match keys like nested_lookup does with wild
+        with_values: also return the dicts holding the value
+    Return:
+        Number of occurrence of the given keyword in the dict, with
+        with_values a tuple of the number and the list of dicts
+    """
+    core = speedups.fast()
+    stats = current_stats()
+    occurrence = 0
     if item == "key":
-        if dictionary.get(keyword) is not None:
-            occurrence[0] += 1
-    elif keyword in list(dictionary.values()):
-        occurrence[0] += list(dictionary.values()).count(keyword)
-        if with_values:
-            values_list.append(dictionary)
-    for key, value in iteritems(dictionary):
-        if isinstance(value, dict):
-            _recursion(value, item, keyword, occurrence, with_values)
-        elif isinstance(value, list):
-            for list_items in value:
-                if hasattr(list_items, "items"):
-                    _recursion(list_items, item, keyword, occurrence, with_values)
-                elif list_items == keyword:
-                    occurrence[0] += 1 if item == "value" else 0
-
-    if values_list:
-        return values_list
-
-
-def _get_occurrence(dictionary, item, keyword):
+        match = _key_matcher(keyword, wild)
+        if match is None and core is not None:
+            return core.count_key(dictionary, keyword)
+        if match is None and stats is None:
+            return len(
+                [v for v in _lookup_all(keyword, dictionary) if v is not None]
+            )
+        for _, key, value in counted(walk(dictionary), "keys_compared"):
+            if value is not None and (
+                (keyword == key) if match is None else match(key)
+            ):
+                occurrence += 1
+        if stats is not None:
+            stats.matches += occurrence
+        return occurrence
+
+    if not with_values and core is not None:
+        return core.count_value(dictionary, keyword)
+    if not with_values and stats is None:
+        return _count_value(keyword, dictionary)
+
+    values = []
+    seen = set()
+    for parent, _, value in counted(walk(dictionary, with_lists=True), "keys_compared"):
+        if (value is keyword or value == keyword) and not (
+            is_sequence(parent) and is_mapping(value)
+        ):
+            occurrence += 1
+            if with_values and is_mapping(parent) and id(parent) not in seen:
+                seen.add(id(parent))
+                values.append(parent)
+    if stats is not None:
+        stats.matches += occurrence
+    if with_values:
+        return occurrence, values
+    return occurrence
+
+
+def _get_occurrence_paths(dictionary, item, keyword, wild=False):
     """
-    Method to get occurrence of a key or value in a nested dictionary
+    Method to get the paths of the occurrences of a key or value
+    in a nested dictionary, in the same walk that finds them
 
     Args:
         dictionary: Nested dictionary
         item: Mostly (key or value)
         keyword: key word to find occurrence
+        wild: match keys like nested_lookup does with wild
     Return:
-        Number of occurrence of the given keyword in the dict
+        List of (path, value) pairs of the given keyword in the dict
     """
-    occurrence = [0]
-    _recursion(dictionary, item, keyword, occurrence)
-
-    global values_list
-    values_list = []
-
-    return occurrence[0]
+    paths = []
+    if item == "key":
+        match = make_matcher(keyword, wild)
+        items = walk(dictionary, with_paths=True)
+        for parent, key, value, node in counted(items, "keys_compared"):
+            if value is not None and match(key):
+                paths.append((build_path(node, key), value))
+    else:
+        items = walk(dictionary, with_lists=True, with_paths=True)
+        for parent, key, value, node in counted(items, "keys_compared"):
+            if (value is keyword or value == keyword) and not (
+                is_sequence(parent) and is_mapping(value)
+            ):
+                paths.append((build_path(node, key), value))
+    stats = current_stats()
+    if stats is not None:
+        stats.matches += len(paths)
+    return paths
@@ -0,0 +1,594 @@
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+# bits of the hash (and of the index) consumed per level of the tries, so
+# every node has up to 32 children
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+# bits of the hash used by the map, keys whose hashes are equal in all of
+# them go into a collision node
+_HASH_BITS = 32
+
+# marks the keys deleted in an evolver of a map
+_DELETED = object()
+
+
+def _hash(key):
+    return hash(key) & 0xFFFFFFFF
+
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+
+class _Node(object):
+    """
+    Node of the map, the bitmap tells which of the 32 slots of its level
+    are used, and entries holds them in order: (key, value) tuples for the
+    items and _Node or _Collision objects for the subtrees
+    """
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision(object):
+    """Node of the (key, value) tuples of the keys with the same hash"""
+
+    __slots__ = ("hash", "entries")
+
+    def __init__(self, hash, entries):
+        self.hash = hash
+        self.entries = entries
+
+
+_EMPTY = _Node(0, ())
+
+# the functions below recurse over the levels of the trie, which are at
+# most 7 for 32 bits of hash
+
+
+def _get(node, h, key):
+    """return the value of the key, raise KeyError if it is not there"""
+    shift = 0
+    while True:
+        if type(node) is _Collision:
+            for k, v in node.entries:
+                if k is key or k == key:
+                    return v
+            raise KeyError(key)
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            raise KeyError(key)
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+        if type(entry) is tuple:
+            if entry[0] is key or entry[0] == key:
+                return entry[1]
+            raise KeyError(key)
+        node = entry
+        shift += _BITS
+
+
+def _merge(shift, h1, entry1, h2, entry2):
+    """return the node holding two entries of different keys"""
+    if h1 == h2:
+        return _Collision(h1, (entry1, entry2))
+    bit1 = (h1 >> shift) & _MASK
+    bit2 = (h2 >> shift) & _MASK
+    if bit1 == bit2:
+        return _Node(1 << bit1, (_merge(shift + _BITS, h1, entry1, h2, entry2),))
+    if bit1 < bit2:
+        return _Node((1 << bit1) | (1 << bit2), (entry1, entry2))
+    return _Node((1 << bit1) | (1 << bit2), (entry2, entry1))
+
+
+def _set(node, shift, h, key, value):
+    """
+    return the node with the key set to the value, copying only the nodes
+    on the path to the key, and whether the key was added
+    """
+    if type(node) is _Collision:
+        if node.hash != h:
+            return _merge(shift, node.hash, node, h, (key, value)), True
+        for i, (k, v) in enumerate(node.entries):
+            if k is key or k == key:
+                if v is value:
+                    return node, False
+                entries = node.entries[:i] + ((key, value),) + node.entries[i + 1 :]
+                return _Collision(h, entries), False
+        return _Collision(h, node.entries + ((key, value),)), True
+
+    bit = 1 << ((h >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    if not node.bitmap & bit:
+        entries = entries[:index] + ((key, value),) + entries[index:]
+        return _Node(node.bitmap | bit, entries), True
+
+    entry = entries[index]
+    if type(entry) is not tuple:
+        child, added = _set(entry, shift + _BITS, h, key, value)
+        if child is entry:
+            return node, False
+    elif entry[0] is key or entry[0] == key:
+        if entry[1] is value:
+            return node, False
+        child, added = (key, value), False
+    else:
+        child = _merge(shift + _BITS, _hash(entry[0]), entry, h, (key, value))
+        added = True
+    return _Node(node.bitmap, entries[:index] + (child,) + entries[index + 1 :]), added
+
+
+def _delete(node, shift, h, key):
+    """
+    return the node without the key, the same node if the key is not
+    there, a (key, value) tuple when a single item is left below the root
+    or None when nothing is left
+    """
+    if type(node) is _Collision:
+        entries = tuple(e for e in node.entries if not (e[0] is key or e[0] == key))
+        if len(entries) == len(node.entries):
+            return node
+        if len(entries) == 1:
+            return entries[0]
+        return _Collision(h, entries)
+
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    index = _popcount(node.bitmap & (bit - 1))
+    entry = node.entries[index]
+    if type(entry) is tuple:
+        if not (entry[0] is key or entry[0] == key):
+            return node
+        child = None
+    else:
+        child = _delete(entry, shift + _BITS, h, key)
+        if child is entry:
+            return node
+
+    if child is None:
+        if node.bitmap == bit:
+            return None
+        entries = node.entries[:index] + node.entries[index + 1 :]
+        node = _Node(node.bitmap & ~bit, entries)
+    else:
+        entries = node.entries[:index] + (child,) + node.entries[index + 1 :]
+        node = _Node(node.bitmap, entries)
+    if shift and len(node.entries) == 1 and type(node.entries[0]) is tuple:
+        # a single item moves up to its parent
+        return node.entries[0]
+    return node
+
+
+def _build(items, shift):
+    """return the node of a list of (hash, key, value) of distinct keys"""
+    if shift >= _HASH_BITS:
+        return _Collision(items[0][0], tuple((k, v) for _, k, v in items))
+    slots = {}
+    for item in items:
+        slots.setdefault((item[0] >> shift) & _MASK, []).append(item)
+    bitmap = 0
+    entries = []
+    for slot in sorted(slots):
+        bitmap |= 1 << slot
+        group = slots[slot]
+        if len(group) == 1:
+            entries.append(group[0][1:])
+        else:
+            entries.append(_build(group, shift + _BITS))
+    return _Node(bitmap, tuple(entries))
+
+
+class PersistentMap(Mapping):
+    """
+    Immutable mapping of a hash array mapped trie. set and delete return a
+    new map sharing all but the O(log width) nodes on the path to the key
+    with this one, which stays valid and unchanged, so readers holding an
+    old version never need a lock nor a copy.
+
+    Items are iterated in the order of the hashes of their keys, not in
+    the order they were set.
+    """
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        self._size = len(items)
+        if items:
+            self._root = _build([(_hash(k), k, v) for k, v in items.items()], 0)
+        else:
+            self._root = _EMPTY
+
+    @classmethod
+    def _of(cls, root, size):
+        new = cls.__new__(cls)
+        new._root = root
+        new._size = size
+        return new
+
+    def __getitem__(self, key):
+        return _get(self._root, _hash(key), key)
+
+    def __contains__(self, key):
+        try:
+            _get(self._root, _hash(key), key)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def iteritems(self):
+        """Yield the (key, value) pairs of the map"""
+        stack = [iter(self._root.entries)]
+        while stack:
+            for entry in stack[-1]:
+                if type(entry) is tuple:
+                    yield entry
+                else:
+                    stack.append(iter(entry.entries))
+                    break
+            else:
+                stack.pop()
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __repr__(self):
+        return "PersistentMap(%r)" % dict(self.iteritems())
+
+    def __reduce__(self):
+        return PersistentMap, (dict(self.iteritems()),)
+
+    def set(self, key, value):
+        """
+        Return:
+            Map with the key set to the value, or this map if the key is
+            already set to this very value
+        """
+        root, added = _set(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return self._of(root, self._size + added)
+
+    def delete(self, key):
+        """
+        Return:
+            Map without the key
+        Raises:
+            KeyError: if the key is not in the map
+        """
+        root = _delete(self._root, 0, _hash(key), key)
+        if root is self._root:
+            raise KeyError(key)
+        if root is None:
+            root = _EMPTY
+        return self._of(root, self._size - 1)
+
+    def evolver(self):
+        """
+        Return:
+            Mutable view of the map collecting item assignments and
+            deletions, its persistent() method returns the new map
+        """
+        return _MapEvolver(self)
+
+
+class _MapEvolver(object):
+    """the writes to a PersistentMap, see PersistentMap.evolver"""
+
+    def __init__(self, base):
+        self._base = base
+        self._changes = {}
+
+    def __getitem__(self, key):
+        try:
+            value = self._changes[key]
+        except KeyError:
+            return self._base[key]
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        try:
+            return self._changes[key] is not _DELETED
+        except KeyError:
+            return key in self._base
+
+    def __setitem__(self, key, value):
+        self._changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._changes[key] = _DELETED
+
+    def __copy__(self):
+        evolver = _MapEvolver(self._base)
+        evolver._changes = dict(self._changes)
+        return evolver
+
+    def changes(self):
+        """Return the (key, value) pairs written to the evolver"""
+        return [
+            (key, value)
+            for key, value in self._changes.items()
+            if value is not _DELETED
+        ]
+
+    def persistent(self):
+        """Return the PersistentMap with the writes applied"""
+        result = self._base
+        for key, value in self._changes.items():
+            if value is not _DELETED:
+                result = result.set(key, value)
+            elif key in result:
+                result = result.delete(key)
+        return result
+
+
+def _new_path(shift, value):
+    """return the nodes down to a leaf holding only the value"""
+    node = (value,)
+    while shift > 0:
+        node = (node,)
+        shift -= _BITS
+    return node
+
+
+def _append(node, shift, index, value):
+    """return the node with the value added at the index, its end"""
+    if shift == 0:
+        return node + (value,)
+    slot = (index >> shift) & _MASK
+    if slot < len(node):
+        return node[:slot] + (_append(node[slot], shift - _BITS, index, value),)
+    return node + (_new_path(shift - _BITS, value),)
+
+
+class PersistentVector(Sequence):
+    """
+    Immutable sequence of a trie of 32 wide tuples. set and append return
+    a new vector sharing all but the O(log width) nodes on the path to the
+    index with this one, which stays valid and unchanged.
+
+    Compares equal to the lists and vectors of equal elements.
+    """
+
+    __slots__ = ("_root", "_shift", "_size")
+
+    def __init__(self, values=()):
+        nodes = tuple(values)
+        self._size = len(nodes)
+        self._shift = 0
+        while len(nodes) > _WIDTH:
+            nodes = tuple(nodes[i : i + _WIDTH] for i in range(0, len(nodes), _WIDTH))
+            self._shift += _BITS
+        self._root = nodes
+
+    @classmethod
+    def _of(cls, root, shift, size):
+        new = cls.__new__(cls)
+        new._root = root
+        new._shift = shift
+        new._size = size
+        return new
+
+    def _index(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("vector index out of range")
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PersistentVector(list(self)[index])
+        index = self._index(index)
+        node = self._root
+        shift = self._shift
+        while shift > 0:
+            node = node[(index >> shift) & _MASK]
+            shift -= _BITS
+        return node[index & _MASK]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        stack = [iter(self._root)]
+        while stack:
+            if len(stack) <= self._shift // _BITS:
+                for node in stack[-1]:
+                    stack.append(iter(node))
+                    break
+                else:
+                    stack.pop()
+            else:
+                for value in stack.pop():
+                    yield value
+
+    def __eq__(self, other):
+        if not isinstance(other, (PersistentVector, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "PersistentVector(%r)" % list(self)
+
+    def __reduce__(self):
+        return PersistentVector, (list(self),)
+
+    def set(self, index, value):
+        """
+        Return:
+            Vector with the element at the index set to the value
+        Raises:
+            IndexError: if the index is out of range
+        """
+        index = self._index(index)
+        path = []
+        node = self._root
+        shift = self._shift
+        while shift > 0:
+            path.append(node)
+            node = node[(index >> shift) & _MASK]
+            shift -= _BITS
+        slot = index & _MASK
+        if node[slot] is value:
+            return self
+        node = node[:slot] + (value,) + node[slot + 1 :]
+        for parent in reversed(path):
+            shift += _BITS
+            slot = (index >> shift) & _MASK
+            node = parent[:slot] + (node,) + parent[slot + 1 :]
+        return self._of(node, self._shift, self._size)
+
+    def append(self, value):
+        """
+        Return:
+            Vector with the value added at its end
+        """
+        if self._size == 1 << (self._shift + _BITS):
+            # the trie is full, it grows a level
+            root = (self._root, _new_path(self._shift, value))
+            return self._of(root, self._shift + _BITS, self._size + 1)
+        root = _append(self._root, self._shift, self._size, value)
+        return self._of(root, self._shift, self._size + 1)
+
+    def evolver(self):
+        """
+        Return:
+            Mutable view of the vector collecting item assignments, its
+            persistent() method returns the new vector
+        """
+        return _VectorEvolver(self)
+
+
+class _VectorEvolver(object):
+    """the writes to a PersistentVector, see PersistentVector.evolver"""
+
+    def __init__(self, base):
+        self._base = base
+        self._changes = {}
+
+    def _index(self, index):
+        return self._base._index(index)
+
+    def __getitem__(self, index):
+        index = self._index(index)
+        try:
+            return self._changes[index]
+        except KeyError:
+            return self._base[index]
+
+    def __setitem__(self, index, value):
+        self._changes[self._index(index)] = value
+
+    def __len__(self):
+        return len(self._base)
+
+    def __copy__(self):
+        evolver = _VectorEvolver(self._base)
+        evolver._changes = dict(self._changes)
+        return evolver
+
+    def changes(self):
+        """Return the (index, value) pairs written to the evolver"""
+        return list(self._changes.items())
+
+    def persistent(self):
+        """Return the PersistentVector with the writes applied"""
+        result = self._base
+        for index, value in self._changes.items():
+            result = result.set(index, value)
+        return result
+
+
+def freeze(document):
+    """
+    Convert a document to its persistent version, which nested_lookup and
+    the other functions walk like the document, and which nested_update,
+    nested_delete and nested_alter update by copying only the paths to
+    the changes, without a deepcopy:
+
+        config = freeze(load_config())
+        new_config = nested_update(config, "timeout", 30)
+        # readers of config still see the old version
+
+    Args:
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+    Return:
+        The document with every dict replaced by a PersistentMap and every
+        list by a PersistentVector
+    """
+    return _convert(document, dict, list, PersistentMap, PersistentVector)
+
+
+def thaw(document):
+    """
+    Convert a persistent document back to dicts and lists, the inverse of
+    freeze.
+    """
+    return _convert(
+        document, (dict, PersistentMap), (list, PersistentVector), dict, list
+    )
+
+
+def _convert(document, mappings, sequences, new_mapping, new_sequence):
+    """
+    convert the mappings and sequences of the document, children first,
+    with an explicit stack
+    """
+
+    def children(value):
+        if isinstance(value, mappings):
+            return iter(value.items())
+        if isinstance(value, sequences):
+            return enumerate(value)
+        return None
+
+    items = children(document)
+    if items is None:
+        return document
+    # stack of [container, its items, its converted items, its key]
+    stack = [[document, items, [], None]]
+    while True:
+        container, items, converted, key = stack[-1]
+        for k, v in items:
+            nested = children(v)
+            if nested is not None:
+                stack.append([v, nested, [], k])
+                break
+            converted.append((k, v))
+        else:
+            stack.pop()
+            if isinstance(container, mappings):
+                value = new_mapping(converted)
+            else:
+                value = new_sequence(v for _, v in converted)
+            if not stack:
+                return value
+            stack[-1][2].append((key, value))
@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+from . import speedups
+from .matchers import Matcher
+from .nested_lookup import _exact_matcher, _key_matcher, _lookup_all, _wild_matcher
+from .stats import current_stats
+from .walker import _walk, walk
+
+
+def compile_lookup(keys, wild=False, with_keys=False, max_depth=None):
+    """
+    Prepare a lookup once to run it on many documents.
+
+        lookup = compile_lookup("name", wild=True)
+        for document in documents:
+            names = lookup(document)
+
+    The options are decided and the matcher is built (and keeps its cache
+    of matched keys) once, so a call costs little more than the walk.
+
+    Args:
+        keys: Key to search for, or a list of keys to search for at once
+        wild, with_keys, max_depth: like nested_lookup
+    Return:
+        LookupPlan to call with a document, returning what nested_lookup
+        returns for a key, and what nested_lookup_many returns for a list
+        of keys
+    """
+    return LookupPlan(keys, wild=wild, with_keys=with_keys, max_depth=max_depth)
+
+
+class LookupPlan(object):
+    """A lookup prepared by compile_lookup, call it with a document"""
+
+    def __init__(self, keys, wild=False, with_keys=False, max_depth=None):
+        self.keys = keys
+        self.wild = wild
+        self.with_keys = with_keys
+        self.max_depth = max_depth
+        # plain lookups of one key can run in the C speedups, or else in
+        # the loop of nested_lookup without options
+        self._exact = not (
+            wild
+            or with_keys
+            or max_depth is not None
+            or isinstance(keys, (list, Matcher))
+        )
+        if isinstance(keys, list):
+            self._collect = self._many_collector(keys, wild, with_keys)
+        else:
+            self._collect = self._collector(keys, wild, with_keys)
+
+    def __repr__(self):
+        return "LookupPlan(%r, wild=%r, with_keys=%r, max_depth=%r)" % (
+            self.keys,
+            self.wild,
+            self.with_keys,
+            self.max_depth,
+        )
+
+    def __call__(self, document):
+        if self._exact:
+            core = speedups.fast()
+            if core is not None:
+                return core.lookup(document, self.keys)
+            if current_stats() is None:
+                return _lookup_all(self.keys, document)
+
+        stats = current_stats()
+        if stats is None:
+            # the walk without the stats hooks
+            items = _walk(document, False, None, None, False, None, self.max_depth)
+            return self._collect(items)
+
+        items = stats.count(walk(document, max_depth=self.max_depth), "keys_compared")
+        result = self._collect(items)
+        values = result.values() if isinstance(result, dict) else [result]
+        for found in values:
+            if isinstance(found, dict):
+                stats.matches += sum(len(v) for v in found.values())
+            else:
+                stats.matches += len(found)
+        return result
+
+    @staticmethod
+    def _collector(key, wild, with_keys):
+        """return the function collecting the result of one key"""
+        match = _key_matcher(key, wild)
+
+        if with_keys:
+
+            def collect(items):
+                results = defaultdict(list)
+                for _, k, v in items:
+                    if (key == k) if match is None else match(k):
+                        results[k].append(v)
+                return results
+
+        elif match is None:
+
+            def collect(items):
+                return [v for _, k, v in items if key == k]
+
+        else:
+
+            def collect(items):
+                return [v for _, k, v in items if match(k)]
+
+        return collect
+
+    @staticmethod
+    def _many_collector(keys, wild, with_keys):
+        """return the function collecting the results of many keys"""
+        unique = []
+        for key in keys:
+            if key not in unique:
+                unique.append(key)
+
+        if wild or any(isinstance(key, Matcher) for key in unique):
+            matcher = _wild_matcher(unique, wild)
+        else:
+            matcher = _exact_matcher(unique)
+
+        def collect(items):
+            results = dict(
+                (key, defaultdict(list) if with_keys else []) for key in unique
+            )
+            for _, k, v in items:
+                for key in matcher(k):
+                    if with_keys:
+                        results[key][k].append(v)
+                    else:
+                        results[key].append(v)
+            return results
+
+        return collect
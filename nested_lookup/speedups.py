@@ -0,0 +1,49 @@
+import os
+
+from . import containers
+from .persistent import PersistentMap, PersistentVector
+from .stats import current_stats
+
+try:
+    from . import _speedups
+except ImportError:
+    # not built, the pure Python walks are used
+    _speedups = None
+else:
+    _speedups.containers((PersistentMap,), (PersistentVector,))
+
+# the C functions in use, NESTED_LOOKUP_PURE_PYTHON=1 turns them off
+core = None if os.environ.get("NESTED_LOOKUP_PURE_PYTHON") else _speedups
+
+
+def available():
+    """return True if the C speedups are built"""
+    return _speedups is not None
+
+
+def use_speedups(enabled=True):
+    """
+    Turn the C speedups on or off, for instance to compare the results
+
+    Return:
+        True if they were on before
+    """
+    global core
+    if enabled and _speedups is None:
+        raise ImportError("the C speedups of nested_lookup are not built")
+    previous = core is not None
+    core = _speedups if enabled else None
+    return previous
+
+
+def fast():
+    """
+    return the C functions when they can replace the Python walk, which
+    is when they are on, no container type besides dict and list is
+    registered and no stats are collected; else None
+    """
+    if core is None or not containers.default_registry:
+        return None
+    if current_stats() is not None:
+        return None
+    return core
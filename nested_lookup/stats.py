@@ -0,0 +1,139 @@
+import copy
+import threading
+import time
+from contextlib import contextmanager
+
+# time.perf_counter is missing before Python 3.3
+_clock = getattr(time, "perf_counter", time.time)
+
+_local = threading.local()
+
+
+class TraversalStats(object):
+    """
+    Counters of the work done by the functions called inside collect_stats.
+
+    Attributes:
+        nodes: Number of items walked (dict items, and list elements for
+            the functions looking at values)
+        dicts: Number of dicts (and other mappings) walked
+        lists: Number of lists (and other sequences) walked
+        keys_compared: Number of keys (or values) compared to the searched
+            key (or value)
+        matches: Number of keys (or values) which matched
+        max_depth: Deepest level of nested containers walked, the document
+            itself is at level 1
+        callback_time: Seconds spent in the callbacks of nested_alter
+        deepcopy_time: Seconds spent deep copying documents
+    """
+
+    _fields = (
+        "nodes",
+        "dicts",
+        "lists",
+        "keys_compared",
+        "matches",
+        "max_depth",
+        "callback_time",
+        "deepcopy_time",
+    )
+
+    def __init__(self):
+        self.nodes = 0
+        self.dicts = 0
+        self.lists = 0
+        self.keys_compared = 0
+        self.matches = 0
+        self.max_depth = 0
+        self.callback_time = 0.0
+        self.deepcopy_time = 0.0
+
+    def as_dict(self):
+        """return the counters as a dict"""
+        return dict((field, getattr(self, field)) for field in self._fields)
+
+    def __repr__(self):
+        return "TraversalStats(%s)" % ", ".join(
+            "%s=%r" % (field, getattr(self, field)) for field in self._fields
+        )
+
+    def count(self, iterable, field):
+        """yield the items of the iterable, adding one to field for each"""
+        for item in iterable:
+            setattr(self, field, getattr(self, field) + 1)
+            yield item
+
+    def timed(self, function, field):
+        """wrap the function to add the seconds spent in it to field"""
+
+        def timed_function(*args, **kwargs):
+            start = _clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                setattr(self, field, getattr(self, field) + _clock() - start)
+
+        return timed_function
+
+
+def current_stats():
+    """return the TraversalStats being collected in this thread, or None"""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def collect_stats():
+    """
+    Collect TraversalStats of every lookup, update, delete and alter
+    called in this thread inside the with block.
+
+        with collect_stats() as stats:
+            nested_lookup("name", document, wild=True)
+        print(stats.nodes, stats.matches)
+
+    Outside of the block the functions only check once per call whether
+    stats are collected. The work done in other threads or processes
+    (like the workers of nested_lookup_batch) is not counted. Nested
+    blocks count into the innermost one.
+    """
+    stats = TraversalStats()
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.pop()
+
+
+def with_stats(function, *args, **kwargs):
+    """
+    Call a function of nested_lookup and collect its TraversalStats.
+
+    Return:
+        Tuple of the result of the function and its TraversalStats
+    """
+    with collect_stats() as stats:
+        result = function(*args, **kwargs)
+    return result, stats
+
+
+def counted(iterable, field):
+    """
+    Count the items of the iterable into field of the current stats, or
+    return the iterable as it is when no stats are collected
+    """
+    stats = current_stats()
+    if stats is None:
+        return iterable
+    return stats.count(iterable, field)
+
+
+def deepcopy(document, copier=copy.deepcopy):
+    """copy.deepcopy (or another copier), timed when stats are collected"""
+    stats = current_stats()
+    if stats is None:
+        return copier(document)
+    return stats.timed(copier, "deepcopy_time")(document)
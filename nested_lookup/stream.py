@@ -0,0 +1,236 @@
+import codecs
+import json
+import re
+from collections import deque
+
+from .matchers import make_matcher
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+_NUMBER_CHARS = re.compile(r"[-+.eE0-9]+")
+_LITERALS = (("true", True), ("false", False), ("null", None))
+
+
+def nested_lookup_stream(key, fileobj, wild=False, with_keys=False, chunk_size=65536):
+    """
+    Lookup a key in a JSON document read incrementally from a file object.
+
+    The document is never loaded as a whole, only the values of the matched
+    keys are built, so memory depends on the size of the matches and not on
+    the size of the file. Values are yielded in the same order as
+    nested_lookup, a value containing other matches is yielded before them.
+
+    Args:
+        key: Key to search for
+        fileobj: File object opened in text or binary (UTF-8) mode
+        wild: Match keys like nested_lookup does with wild
+        with_keys: Yield (key, value) pairs instead of values
+        chunk_size: Number of characters (or bytes) read at a time
+    Yield:
+        Every value (or (key, value) pair) of the key in the document
+    """
+    events = _iter_events(_Tokenizer(fileobj, chunk_size))
+    for k, v in _stream_lookup(key, events, wild=wild):
+        if with_keys:
+            yield k, v
+        else:
+            yield v
+
+
+def _stream_lookup(key, events, wild=False):
+    """
+    Build the values of the matching keys from the parse events,
+    yield (key, value) pairs in document order.
+
+    Only the outermost match is built, matches nested in it share the
+    objects of the outer value. Every match is a [key, value, done] slot
+    queued in the order the values start, so a slot is released only
+    after the values started before it are complete.
+    """
+    match = make_matcher(key, wild)
+    slots = deque()
+    # stack of [container, slot, pending dict key] for the value being built
+    builder = None
+    matched = None
+    for event, value in events:
+        if event == "key":
+            if match(value):
+                matched = value
+            if builder is not None:
+                builder[-1][2] = value
+            continue
+
+        if event == "end":
+            if builder is not None:
+                _, slot, _ = builder.pop()
+                if slot is not None:
+                    slot[2] = True
+                if not builder:
+                    builder = None
+        elif builder is not None or matched is not None:
+            if event == "start_map":
+                value = {}
+            elif event == "start_array":
+                value = []
+            if builder is not None:
+                parent = builder[-1]
+                if isinstance(parent[0], dict):
+                    parent[0][parent[2]] = value
+                else:
+                    parent[0].append(value)
+            slot = None
+            if matched is not None:
+                slot = [matched, value, event == "value"]
+                slots.append(slot)
+                matched = None
+            if event != "value":
+                if builder is None:
+                    builder = []
+                builder.append([value, slot, None])
+
+        while slots and slots[0][2]:
+            k, v, _ = slots.popleft()
+            yield k, v
+
+
+def _iter_events(tokens):
+    """
+    Parse JSON tokens, yield (event, value) pairs where event is one of
+    start_map, start_array, end, key and value.
+    """
+    stack = []
+    # what the parser expects next: value, key, colon or comma
+    expect = "value"
+    first = False
+    for token, value in tokens:
+        if expect == "done":
+            raise ValueError("Extra data after the JSON document")
+        if expect == "value":
+            if token == "{":
+                stack.append("{")
+                expect, first = "key", True
+                yield "start_map", None
+                continue
+            if token == "[":
+                stack.append("[")
+                expect, first = "value", True
+                yield "start_array", None
+                continue
+            if token == "]" and first and stack and stack[-1] == "[":
+                stack.pop()
+                yield "end", None
+            elif token in ("string", "scalar"):
+                yield "value", value
+            else:
+                raise ValueError("Expecting value, got %r" % (value or token))
+        elif expect == "key":
+            if token == "string":
+                expect = "colon"
+                yield "key", value
+                continue
+            if token == "}" and first:
+                stack.pop()
+                yield "end", None
+            else:
+                raise ValueError("Expecting property name, got %r" % (value or token))
+        elif expect == "colon":
+            if token != ":":
+                raise ValueError("Expecting ':' delimiter, got %r" % (value or token))
+            expect, first = "value", False
+            continue
+        else:
+            if token == ",":
+                expect = "key" if stack[-1] == "{" else "value"
+                first = False
+                continue
+            if token == ("}" if stack[-1] == "{" else "]"):
+                stack.pop()
+                yield "end", None
+            else:
+                raise ValueError("Expecting ',' delimiter, got %r" % (value or token))
+        # a value is complete
+        expect = "comma" if stack else "done"
+    if expect != "done":
+        raise ValueError("Unexpected end of the JSON document")
+
+
+class _Tokenizer(object):
+    """
+    Split a JSON file object into (token, value) pairs, reading one chunk
+    at a time. Punctuation tokens are their own character, strings and
+    other scalars come as ("string", value) and ("scalar", value).
+    """
+
+    def __init__(self, fileobj, chunk_size):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = None
+        self.buf = u""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        """append the next chunk to the buffer, return False at the end"""
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            chunk = self.decoder.decode(b"", True) if self.decoder else u""
+        elif isinstance(chunk, bytes):
+            if self.decoder is None:
+                self.decoder = codecs.getincrementaldecoder("utf-8")()
+            chunk = self.decoder.decode(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def __iter__(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos == len(self.buf):
+                if self._read():
+                    continue
+                return
+            char = self.buf[self.pos]
+            if char in "{}[]:,":
+                self.pos += 1
+                yield char, None
+            elif char == '"':
+                match = _STRING.match(self.buf, self.pos)
+                if match is None:
+                    if self._read():
+                        continue
+                    raise ValueError("Unterminated string in the JSON document")
+                self.pos = match.end()
+                yield "string", json.loads(match.group())
+            else:
+                run = _NUMBER_CHARS.match(self.buf, self.pos)
+                if run is not None:
+                    # a number may go on in the next chunk
+                    if run.end() == len(self.buf) and self._read():
+                        continue
+                    match = _NUMBER.match(self.buf, self.pos)
+                    if match is None or match.end() != run.end():
+                        raise ValueError(
+                            "Invalid number %r in the JSON document" % run.group()
+                        )
+                    self.pos = match.end()
+                    if match.group(1) or match.group(2):
+                        yield "scalar", float(match.group())
+                    else:
+                        yield "scalar", int(match.group())
+                    continue
+                for word, value in _LITERALS:
+                    if self.buf.startswith(word, self.pos):
+                        self.pos += len(word)
+                        yield "scalar", value
+                        break
+                else:
+                    rest = self.buf[self.pos:]
+                    if any(word.startswith(rest) for word, _ in _LITERALS):
+                        if self._read():
+                            continue
+                    raise ValueError("Unexpected %r in the JSON document" % char)
@@ -0,0 +1,196 @@
+from .containers import dispatch, handler_of, is_mapping
+from .stats import current_stats
+
+# sequences which are cheap to scan for containers before walking them
+_SCANNABLE = (list, tuple)
+
+# depth at which the walks first look for a container inside itself, the
+# depth of the next look doubles so looking costs the walk a comparison
+# per container
+_CYCLE_CHECK_DEPTH = 1000
+
+
+def walk(
+    document,
+    with_lists=False,
+    enter=None,
+    leave=None,
+    with_paths=False,
+    prune=None,
+    max_depth=None,
+    once=False,
+):
+    """
+    Walk a nested document with an explicit stack instead of recursion,
+    so the depth of the document is bounded only by memory.
+
+    Dicts and lists are walked, and the types registered with
+    register_container like them.
+
+    Args:
+        document: Might be List of Dicts (or) Dict of Lists (or)
+            Dict of List of Dicts etc...
+        with_lists: Also yield the elements of every list
+        enter: Optional function called with every dict and list right
+            before its items are walked, the document itself included.
+            It may remove items from the container it is given.
+        leave: Optional function called with every dict and list after
+            all of its items were walked, the document itself included
+        with_paths: Also yield the path node of the parent container,
+            pass it to build_path to get the path of the item. A path node
+            is a (parent node, key, container) tuple.
+        prune: Optional function called with the key and value of every
+            dict item, the walk does not descend into the value when it
+            returns True
+        max_depth: Optional number of levels to walk, the items of the
+            document are at level 0 and every dict and list adds a level.
+            Deeper containers are not entered, nor left.
+        once: Walk the containers found on several paths (like the
+            aliases of YAML documents) only the first time, their items
+            are yielded once
+    Yield:
+        (parent, key, value) for every item of every dict in the document
+        (and (list, index, element) for list elements with with_lists).
+        Items come in depth first order, every item is yielded before the
+        walk descends into its value.
+    Raise:
+        ValueError: if a container holds itself, unless walked once or
+            within a max_depth
+    """
+    stats = current_stats()
+    if stats is None:
+        return _walk(
+            document, with_lists, enter, leave, with_paths, prune, max_depth, once
+        )
+    enter, leave = _counting(stats, enter, leave)
+    items = _walk(
+        document, with_lists, enter, leave, with_paths, prune, max_depth, once
+    )
+    return stats.count(items, "nodes")
+
+
+def _walk(document, with_lists, enter, leave, with_paths, prune, max_depth, once=False):
+    """the walk itself, see walk"""
+    handlers = dispatch
+    # ids of the containers walked, with once
+    walked = set() if once else None
+    check_at = _CYCLE_CHECK_DEPTH
+    stack = [(None, enumerate((document,)), False, False, None)]
+    while stack:
+        parent, items, emit, mapping, node = stack[-1]
+        for key, value in items:
+            if emit:
+                if with_paths:
+                    yield parent, key, value, node
+                else:
+                    yield parent, key, value
+            if prune is not None and mapping and prune(key, value):
+                continue
+            if max_depth is not None and len(stack) > max_depth + 1:
+                continue
+            try:
+                handler = handlers[type(value)]
+            except KeyError:
+                handler = handler_of(type(value))
+            if handler is None:
+                continue
+            if walked is not None:
+                if id(value) in walked:
+                    continue
+                walked.add(id(value))
+            if enter is not None:
+                enter(value)
+            if not handler[0] and not with_lists and _only_scalars(value):
+                # nothing to yield in there
+                if leave is not None:
+                    leave(value)
+                continue
+            if len(stack) >= check_at:
+                _check_cycle(entry[0] for entry in stack)
+                check_at *= 2
+            stack.append(
+                (
+                    value,
+                    handler[1](value),
+                    handler[0] or with_lists,
+                    handler[0],
+                    (node, key, value) if with_paths else None,
+                )
+            )
+            break
+        else:
+            stack.pop()
+            if leave is not None and stack:
+                leave(parent)
+
+
+def _counting(stats, enter, leave):
+    """
+    wrap the enter and leave functions of a walk to count the containers
+    and the depth of the walk into the stats
+    """
+    depth = [0]
+
+    def counting_enter(container):
+        if is_mapping(container):
+            stats.dicts += 1
+        else:
+            stats.lists += 1
+        depth[0] += 1
+        if depth[0] > stats.max_depth:
+            stats.max_depth = depth[0]
+        if enter is not None:
+            enter(container)
+
+    def counting_leave(container):
+        depth[0] -= 1
+        if leave is not None:
+            leave(container)
+
+    return counting_enter, counting_leave
+
+
+def _check_cycle(containers):
+    """
+    raise ValueError if a container is on the stack of a walk twice, the
+    document holds itself and walking it would never end
+    """
+    seen = set()
+    for container in containers:
+        if id(container) in seen:
+            raise ValueError(
+                "a %s of the document contains itself, its walk would "
+                "never end" % type(container).__name__
+            )
+        seen.add(id(container))
+
+
+def _only_scalars(values):
+    """
+    return True if no element of the list (or tuple) is a container,
+    checking the types of the elements in C rather than one by one
+    """
+    if not isinstance(values, _SCANNABLE):
+        # other sequences may be lazy, they are walked
+        return False
+    if values and handler_of(type(values[0])) is not None:
+        return False
+    return all(handler_of(t) is None for t in set(map(type, values)))
+
+
+def build_path(node, key):
+    """
+    Build the path of an item from the path node of its parent container.
+
+    Path nodes are (parent node, key, container) tuples pointing back to
+    the document, so the walk only allocates one small tuple per container
+    and the path tuple is built only for the items that are asked for.
+    Return:
+        Tuple of the dict keys and list indexes leading to the item
+    """
+    keys = [key]
+    while node[0] is not None:
+        node, k, _ = node
+        keys.append(k)
+    keys.reverse()
+    return tuple(keys)
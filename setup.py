@@ -1,6 +1,9 @@
 # installation: pip install nested-lookup
 
-from setuptools import setup, find_packages
+import platform
+import sys
+
+from setuptools import setup, find_packages, Extension
 
 
 # get list of requirement strings from requirements.txt
@@ -21,6 +24,19 @@ def requirements():
 
 print(requirements())
 
+
+def ext_modules():
+    # the C speedups are optional, the package falls back to pure Python
+    # when they are not built (on Python 2, PyPy or without a compiler)
+    if sys.version_info[0] < 3 or platform.python_implementation() != "CPython":
+        return []
+    return [
+        Extension(
+            "nested_lookup._speedups", ["nested_lookup/_speedups.c"], optional=True
+        )
+    ]
+
+
 setup(
     name="nested-lookup",
     version="0.2.23",
@@ -33,6 +49,7 @@ setup(
     platforms=["All"],
     license="Public Domain",
     packages=find_packages(),
+    ext_modules=ext_modules(),
     include_package_data=True,
     install_requires=requirements(),
     classifiers=[
@@ -0,0 +1,78 @@
+import asyncio
+import copy
+from unittest import TestCase
+
+from nested_lookup import (
+    anested_lookup,
+    anested_update,
+    nested_lookup,
+    nested_update,
+)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncApi(TestCase):
+    def setUp(self):
+        self.document = {
+            "records": [
+                {"id": i, "user": {"name": "user%d" % i, "tags": ["a", {"id": -i}]}}
+                for i in range(100)
+            ]
+        }
+
+    def test_anested_lookup(self):
+        for kwargs in [{}, {"with_keys": True}, {"with_paths": True}, {"limit": 7}]:
+            self.assertEqual(
+                nested_lookup("id", self.document, **kwargs),
+                run(anested_lookup("id", self.document, yield_every=13, **kwargs)),
+            )
+        self.assertEqual(
+            nested_lookup("NAME", self.document, wild=True),
+            run(anested_lookup("NAME", self.document, wild=True, offload=True)),
+        )
+
+    def test_anested_lookup_yields_to_the_loop(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def lookup():
+            task = asyncio.ensure_future(ticker())
+            result = await anested_lookup("name", self.document, yield_every=50)
+            task.cancel()
+            return result
+
+        self.assertEqual(100, len(run(lookup())))
+        self.assertGreater(len(ticks), 5)
+
+    def test_anested_update(self):
+        original = copy.deepcopy(self.document)
+        expected = nested_update(copy.deepcopy(self.document), "id", 0, in_place=True)
+        result = run(anested_update(self.document, "id", 0, yield_every=11))
+        self.assertEqual(expected, result)
+        self.assertEqual(original, self.document)
+        self.assertIs(
+            self.document["records"][0]["user"]["name"],
+            result["records"][0]["user"]["name"],
+        )
+
+        result = run(
+            anested_update(
+                self.document, "id", [1, 2], treat_as_element=False, offload=True
+            )
+        )
+        self.assertEqual([1, 2, 2], nested_lookup("id", result)[:3])
+
+        result = run(anested_update(self.document, "id", 0, in_place=True))
+        self.assertIs(self.document, result)
+        self.assertEqual(expected, self.document)
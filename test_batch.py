@@ -0,0 +1,54 @@
+from unittest import TestCase, skipUnless
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+from nested_lookup import nested_lookup, nested_lookup_batch
+
+
+class TestNestedLookupBatch(TestCase):
+    def setUp(self):
+        self.documents = [
+            {"id": i, "user": {"name": "user%d" % i, "groups": [{"id": i * 10}]}}
+            for i in range(50)
+        ]
+
+    def expected(self, key, **kwargs):
+        return [nested_lookup(key, document, **kwargs) for document in self.documents]
+
+    def test_serial_fallback(self):
+        self.assertEqual(self.expected("id"), nested_lookup_batch("id", self.documents))
+        self.assertEqual(
+            self.expected("id"), nested_lookup_batch("id", self.documents, workers=1)
+        )
+
+    def test_process_pool(self):
+        self.assertEqual(
+            self.expected("id"),
+            nested_lookup_batch(
+                "id", self.documents, workers=2, chunksize=7, min_parallel=0
+            ),
+        )
+        self.assertEqual(
+            self.expected("NAME", wild=True, with_keys=True),
+            nested_lookup_batch(
+                "NAME",
+                iter(self.documents),
+                workers=2,
+                min_parallel=0,
+                wild=True,
+                with_keys=True,
+            ),
+        )
+
+    @skipUnless(ThreadPoolExecutor, "concurrent.futures is missing")
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            self.assertEqual(
+                self.expected("name"),
+                nested_lookup_batch("name", self.documents, executor=executor),
+            )
+            self.assertEqual([], nested_lookup_batch("name", [], executor=executor))
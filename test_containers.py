@@ -0,0 +1,111 @@
+from collections import OrderedDict, namedtuple
+from unittest import TestCase
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+from nested_lookup import (
+    nested_lookup,
+    nested_update,
+    nested_delete,
+    nested_alter,
+    get_all_keys,
+    get_occurrence_of_value,
+    register_container,
+    unregister_container,
+)
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+class Record(Mapping):
+    """a read only mapping which is not a dict"""
+
+    def __init__(self, **fields):
+        self._fields = fields
+
+    def __getitem__(self, key):
+        return self._fields[key]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+
+class Node(object):
+    """a custom type holding its children in attributes"""
+
+    def __init__(self, name, children=()):
+        self.name = name
+        self.children = list(children)
+
+    def fields(self):
+        return iter([("name", self.name), ("children", self.children)])
+
+
+class TestContainers(TestCase):
+    def setUp(self):
+        self.document = {"a": ({"name": 1}, [{"name": 2}]), "b": Record(name=3)}
+
+    def tearDown(self):
+        for cls in (tuple, Mapping, Sequence, Node):
+            unregister_container(cls)
+
+    def test_only_dicts_and_lists_by_default(self):
+        self.assertEqual([], nested_lookup("name", self.document))
+        ordered = OrderedDict([("x", OrderedDict([("name", 4)]))])
+        self.assertEqual([4], nested_lookup("name", ordered))
+
+    def test_register_tuple(self):
+        register_container(tuple)
+        self.assertEqual([1, 2], nested_lookup("name", self.document))
+        self.assertEqual(
+            [(("a", 0, "name"), 1), (("a", 1, 0, "name"), 2)],
+            nested_lookup("name", self.document, with_paths=True),
+        )
+        self.assertEqual(1, get_occurrence_of_value(self.document, 2))
+        unregister_container(tuple)
+        self.assertEqual([], nested_lookup("name", self.document))
+
+    def test_register_mapping_abc(self):
+        register_container(Mapping)
+        self.assertEqual([3], nested_lookup("name", self.document))
+        self.assertEqual(["a", "b", "name"], get_all_keys(self.document))
+
+    def test_strings_are_not_walked(self):
+        register_container(Sequence)
+        self.assertEqual([1, 2], nested_lookup("name", self.document))
+        self.assertEqual(1, get_occurrence_of_value({"a": ["xy"]}, "xy"))
+
+    def test_custom_children(self):
+        register_container(Node, children=Node.fields, mapping=True)
+        tree = Node("root", [Node("left"), Node("right", [Node("leaf")])])
+        self.assertEqual(
+            ["root", "left", "right", "leaf"], nested_lookup("name", {"tree": tree})
+        )
+
+    def test_write_into_registered_containers(self):
+        register_container(tuple)
+        # tuples are rebuilt on write
+        updated = nested_update(self.document, "name", 0)
+        self.assertEqual([0, 0], nested_lookup("name", updated))
+        self.assertIsInstance(updated["a"], tuple)
+        self.assertEqual([1, 2], nested_lookup("name", self.document))
+        deleted = nested_delete(self.document, "name")
+        self.assertEqual(({}, [{}]), deleted["a"])
+        altered = nested_alter(self.document, "a", list)
+        self.assertEqual([{"name": 1}, [{"name": 2}]], altered["a"])
+        point = Point(1, {"name": 2})
+        self.assertEqual(Point(1, {"name": 0}), nested_update(point, "name", 0))
+        # other immutable containers can only be read
+        register_container(Mapping)
+        self.assertRaises(TypeError, nested_update, self.document, "name", 0)
+        unregister_container(Mapping)
+        result = nested_update(self.document, "name", 0, in_place=True)
+        self.assertEqual([0, 0], nested_lookup("name", result))
+        nested_delete(self.document, "name", in_place=True)
+        self.assertEqual([], nested_lookup("name", self.document))
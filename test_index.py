@@ -0,0 +1,110 @@
+from unittest import TestCase
+
+from nested_lookup import (
+    NestedIndex,
+    nested_lookup,
+    nested_update,
+    get_all_keys,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    nested_find_values,
+)
+
+
+class TestNestedIndex(TestCase):
+    def setUp(self):
+        self.document = {
+            "build_version": {
+                "model_name": "MacBook Pro",
+                "build_version": {
+                    "processor_name": "Intel Core i7",
+                    "core_details": {"build_version": "4", "memory": "256 KB"},
+                },
+                "number_of_cores": "4",
+                "memory": "256 KB",
+            },
+            "hardware": [
+                {"memory": None, "zones": ["mzdfw", "4", ["4"]]},
+                {"Build_Version": "17G65", 5: "4"},
+            ],
+        }
+        self.index = NestedIndex(self.document)
+
+    def test_lookup(self):
+        for key in ["build_version", "memory", "zones", 5, "missing"]:
+            self.assertEqual(
+                nested_lookup(key, self.document), self.index.lookup(key)
+            )
+
+    def test_lookup_wild_with_keys(self):
+        for key in ["version", "MEM", 5]:
+            self.assertEqual(
+                nested_lookup(key, self.document, wild=True),
+                self.index.lookup(key, wild=True),
+            )
+            self.assertEqual(
+                nested_lookup(key, self.document, wild=True, with_keys=True),
+                self.index.lookup(key, wild=True, with_keys=True),
+            )
+
+    def test_lookup_unhashable_key(self):
+        self.assertEqual([], self.index.lookup(["memory"]))
+
+    def test_paths(self):
+        self.assertEqual(
+            [
+                ("build_version", "build_version", "core_details", "memory"),
+                ("build_version", "memory"),
+                ("hardware", 0, "memory"),
+            ],
+            self.index.paths("memory"),
+        )
+        self.assertEqual(
+            [
+                ("build_version", "build_version", "core_details", "build_version"),
+                ("build_version", "number_of_cores"),
+                ("hardware", 0, "zones", 1),
+                ("hardware", 0, "zones", 2, 0),
+                ("hardware", 1, 5),
+            ],
+            self.index.paths_of_value("4"),
+        )
+        self.assertEqual(
+            [(("hardware", 1, "Build_Version"), "17G65")],
+            self.index.lookup("build_version", wild=True, with_paths=True)[-1:],
+        )
+
+    def test_occurrences(self):
+        for key in ["build_version", "memory", "zones", 5]:
+            self.assertEqual(
+                get_occurrence_of_key(self.document, key),
+                self.index.get_occurrence_of_key(key),
+            )
+        for value in ["4", "256 KB", "missing", ["4"]]:
+            self.assertEqual(
+                get_occurrence_of_value(self.document, value),
+                self.index.get_occurrence_of_value(value),
+            )
+
+    def test_find_values(self):
+        for value in ["4", "256 KB", "missing", None, 5, ["4"]]:
+            for with_paths in (True, False):
+                self.assertEqual(
+                    list(nested_find_values(value, self.document, with_paths)),
+                    self.index.find_values(value, with_paths),
+                )
+        self.assertEqual(
+            self.index.find_values("4"), self.index.find_values(lambda v: v == "4")
+        )
+        self.assertEqual(5, len(self.index.find_values("4")))
+
+    def test_get_all_keys(self):
+        self.assertEqual(get_all_keys(self.document), self.index.get_all_keys())
+
+    def test_refresh(self):
+        nested_update(self.document, "memory", "16 GB", in_place=True)
+        self.assertEqual(["256 KB", "256 KB", None], self.index.lookup("memory"))
+        self.index.refresh()
+        self.assertEqual(["16 GB"] * 3, self.index.lookup("memory"))
+        self.index.refresh({"memory": "8 GB"})
+        self.assertEqual(["8 GB"], self.index.lookup("memory"))
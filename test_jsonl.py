@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+
+from nested_lookup import (
+    nested_lookup,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    scan_jsonl,
+    count_jsonl_value,
+)
+from nested_lookup.jsonl import _shards
+
+
+class TestScanJsonl(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "records.jsonl")
+        self.records = [
+            {"id": i, "user": {"Name": "user%d" % i, "groups": [{"id": i % 3}]}}
+            for i in range(200)
+        ]
+        with open(self.path, "w") as f:
+            for i, record in enumerate(self.records):
+                f.write(json.dumps(record) + "\n")
+                if i % 50 == 0:
+                    f.write("\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected(self, key, **kwargs):
+        return [v for r in self.records for v in nested_lookup(key, r, **kwargs)]
+
+    def test_shards_end_on_lines(self):
+        shards = _shards(self.path, 1000)
+        self.assertGreater(len(shards), 5)
+        self.assertEqual(0, shards[0][0])
+        self.assertEqual(os.path.getsize(self.path), shards[-1][1])
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for (start, end), (next_start, _) in zip(shards, shards[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(b"\n", data[end - 1 : end])
+
+    def test_serial(self):
+        self.assertEqual(
+            self.expected("id"), list(scan_jsonl(self.path, "id", workers=1))
+        )
+
+    def test_process_pool(self):
+        self.assertEqual(
+            self.expected("NAME", wild=True),
+            list(scan_jsonl(self.path, "NAME", workers=2, wild=True, shard_size=1000)),
+        )
+
+    @skipUnless(ThreadPoolExecutor, "concurrent.futures is missing")
+    def test_executor_and_counts(self):
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(
+                self.expected("id"),
+                list(scan_jsonl(self.path, "id", shard_size=500, executor=executor)),
+            )
+            self.assertEqual(
+                sum(get_occurrence_of_key(r, "id") for r in self.records),
+                scan_jsonl(
+                    self.path, "id", count=True, shard_size=500, executor=executor
+                ),
+            )
+            self.assertEqual(
+                sum(get_occurrence_of_value(r, 2) for r in self.records),
+                count_jsonl_value(self.path, 2, shard_size=500, executor=executor),
+            )
+
+    def test_empty_file(self):
+        open(self.path, "w").close()
+        self.assertEqual([], list(scan_jsonl(self.path, "id")))
+        self.assertEqual(0, count_jsonl_value(self.path, 1))
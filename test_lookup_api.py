@@ -1,7 +1,12 @@
+import copy
+from collections import OrderedDict
 from unittest import TestCase
 
-from nested_lookup import nested_lookup, nested_update
-from nested_lookup import nested_delete, nested_alter
+from nested_lookup import nested_lookup, nested_update, nested_update_many
+from nested_lookup import nested_delete, nested_alter, GlobMatcher
+from nested_lookup import collect_stats, use_speedups
+
+from test_nested_lookup import ExplodingDict
 
 
 class BaseLookUpApi(TestCase):
@@ -157,6 +162,67 @@ class TestNestedDelete(BaseLookUpApi):
         }
         self.assertEqual(result, nested_delete(self.sample_data5, "key5"))
 
+    def test_deep_document_in_place(self):
+        document = {"key": "bottom"}
+        for depth in range(5000):
+            document = {"key": depth, "next": [document]}
+        copied = nested_delete(document, "key")
+        self.assertEqual([], nested_lookup("key", copied))
+        self.assertEqual(5001, len(nested_lookup("key", document)))
+        nested_delete(document, "key", in_place=True)
+        self.assertEqual([], nested_lookup("key", document))
+        self.assertEqual(5000, len(nested_lookup("next", document)))
+
+    def test_many_keys(self):
+        keys = {"build_version", "name", "memory", "missing"}
+        expected = self.sample_data1
+        for key in keys:
+            expected = nested_delete(expected, key)
+        original = copy.deepcopy(self.sample_data1)
+        self.assertEqual(expected, nested_delete(self.sample_data1, keys))
+        self.assertEqual(original, self.sample_data1)
+        self.assertEqual(expected, nested_delete(self.sample_data1, list(keys)))
+        result = nested_delete(self.sample_data1, keys, in_place=True)
+        self.assertIs(self.sample_data1, result)
+        self.assertEqual(expected, result)
+
+    def test_wild_keys(self):
+        document = {
+            "user": {"Password": "a", "password_hash": "b", "name": "c"},
+            "events": [{"api_TOKEN": "d", "id": 1}],
+        }
+        expected = {"user": {"name": "c"}, "events": [{"id": 1}]}
+        for in_place in (False, True):
+            self.assertEqual(
+                expected,
+                nested_delete(
+                    copy.deepcopy(document),
+                    ["password", "token"],
+                    in_place=in_place,
+                    wild=True,
+                ),
+            )
+        self.assertEqual(
+            {"user": {"password_hash": "b", "name": "c"}, "events": [{"id": 1}]},
+            nested_delete(document, {"Password", GlobMatcher("*TOKEN")}),
+        )
+
+    def test_deleted_values_are_not_walked(self):
+        document = {"secret": ExplodingDict(a=1), "b": {"secret": ExplodingDict()}}
+        for in_place in (False, True):
+            self.assertEqual(
+                {"b": {}}, nested_delete(document, {"secret"}, in_place=in_place)
+            )
+
+    def test_shared_containers(self):
+        secret = {"password": "x", "name": "a"}
+        document = {"p": secret, "q": [secret, {"r": secret}]}
+        result = nested_delete(document, "password")
+        self.assertEqual([], nested_lookup("password", result))
+        self.assertIs(result["p"], result["q"][0])
+        self.assertIs(result["p"], result["q"][1]["r"])
+        self.assertEqual("x", secret["password"])
+
 class TestNestedUpdate(BaseLookUpApi):
     def test_sample_data1(self):
         result = {
@@ -331,6 +397,103 @@ class TestNestedUpdate(BaseLookUpApi):
         # the object ids should match.
         self.assertEqual(before_id, after_id)
 
+    def test_nested_update_in_place_false_copy_on_write(self):
+        original = copy.deepcopy(self.sample_data1)
+        result = nested_update(self.sample_data1, "processor_speed", "3.1 GHz")
+        self.assertEqual(original, self.sample_data1)
+        expected = copy.deepcopy(original)
+        expected["build_version"]["build_version"]["processor_speed"] = "3.1 GHz"
+        self.assertEqual(expected, result)
+        # only the containers leading to the update are copied
+        self.assertIsNot(self.sample_data1["build_version"], result["build_version"])
+        self.assertIs(self.sample_data1["os_details"], result["os_details"])
+        self.assertIs(
+            self.sample_data1["build_version"]["build_version"]["core_details"],
+            result["build_version"]["build_version"]["core_details"],
+        )
+
+    def test_nested_update_in_place_false_within_updated_value(self):
+        document = [{"taco": {"taco": 1, "salsa": [{"taco": 2}]}}, {"taco": 3}]
+        original = copy.deepcopy(document)
+        expected = nested_update(
+            copy.deepcopy(document), "taco", [10, 20, 30, 40], in_place=True,
+            treat_as_element=False,
+        )
+        result = nested_update(
+            document, "taco", [10, 20, 30, 40], treat_as_element=False
+        )
+        self.assertEqual(original, document)
+        self.assertEqual(expected, result)
+        self.assertEqual([{"taco": 10}, {"taco": 40}], result)
+
+    def test_nested_delete_in_place_false_copy_on_write(self):
+        document = [{"a": {"b": 1, "c": {"b": 2}}}, {"d": [{"b": 3}], "e": {"f": 4}}]
+        original = copy.deepcopy(document)
+        result = nested_delete(document, "b")
+        self.assertEqual(original, document)
+        self.assertEqual([{"a": {"c": {}}}, {"d": [{}], "e": {"f": 4}}], result)
+        self.assertIs(document[1]["e"], result[1]["e"])
+        self.assertEqual(
+            nested_delete(copy.deepcopy(document), "a", in_place=True),
+            nested_delete(document, "a"),
+        )
+
+    def test_nested_update_shared_containers(self):
+        shared = {"x": 1}
+        document = {"p": shared, "q": [shared], "r": {"s": shared}}
+        result = nested_update(document, "x", 2)
+        self.assertEqual([2, 2, 2], nested_lookup("x", result))
+        self.assertIs(result["p"], result["q"][0])
+        self.assertEqual({"x": 1}, shared)
+
+        expected = nested_update(
+            copy.deepcopy(document), "x", [3, 4, 5], in_place=True,
+            treat_as_element=False,
+        )
+        result = nested_update(document, "x", [3, 4, 5], treat_as_element=False)
+        self.assertEqual(expected, result)
+        self.assertEqual([5, 5, 5], nested_lookup("x", result))
+
+        # the copy is written through a path whose container was replaced
+        shared = {"c": 1}
+        document = [shared, {"c": shared}]
+        result = nested_update(document, "c", [7, 8, 9], treat_as_element=False)
+        self.assertEqual([{"c": 9}, {"c": 8}], result)
+        self.assertEqual({"c": 1}, shared)
+
+    def test_nested_update_many_shared_containers(self):
+        shared = {"x": 1, "y": {"x": 2}}
+        document = [shared, {"z": shared}]
+        result = nested_update_many({"x": 0, "y": None}, document)
+        self.assertEqual([{"x": 0, "y": None}, {"z": {"x": 0, "y": None}}], result)
+        self.assertIs(result[0], result[1]["z"])
+        self.assertEqual({"x": 1, "y": {"x": 2}}, shared)
+
+        # a replaced container stays replaced on the other paths too
+        document = {"p": shared, "q": {"y": shared["y"]}}
+        result = nested_update_many({"y": 5}, document)
+        self.assertEqual({"p": {"x": 1, "y": 5}, "q": {"y": 5}}, result)
+
+    def test_nested_update_deep_document_in_place(self):
+        document = {"key": "bottom"}
+        for depth in range(5000):
+            document = {"key": depth, "next": [document]}
+        nested_update(document, "key", "updated", in_place=True)
+        self.assertEqual(["updated"] * 5001, nested_lookup("key", document))
+
+    def test_nested_update_in_place_without_walk(self):
+        # without stats the update in place does not go through walk
+        self.addCleanup(use_speedups, use_speedups(False))
+        document = {"a": [1, {"a": {"a": 2}}], "b": [[{"a": 3}], ["a"]], "c": 4}
+        expected = copy.deepcopy(document)
+        with collect_stats():
+            nested_update(expected, "a", [5, 6, 7], in_place=True,
+                          treat_as_element=False)
+        nested_update(document, "a", [5, 6, 7], in_place=True,
+                      treat_as_element=False)
+        self.assertEqual(expected, document)
+        self.assertEqual([5, 7], nested_lookup("a", document))
+
     def test_nested_update_taco_for_example(self):
         document = [{"taco": 42}, {"salsa": [{"burrito": {"taco": 69}}]}]
 
@@ -345,6 +508,32 @@ class TestNestedUpdate(BaseLookUpApi):
         # one by one
         self.assertEqual(updated_document[1]["salsa"][0]["burrito"]["taco"], 200)
 
+    def test_nested_update_many(self):
+        original = copy.deepcopy(self.sample_data1)
+        updates = {"memory": "32 GB", "product_version": "11.0", "missing": 1}
+        expected = self.sample_data1
+        for key, value in updates.items():
+            expected = nested_update(expected, key, value)
+        result = nested_update_many(updates, self.sample_data1)
+        self.assertEqual(expected, result)
+        self.assertEqual(original, self.sample_data1)
+        self.assertEqual([], nested_lookup("missing", result))
+
+        result = nested_update_many(updates, self.sample_data1, in_place=True)
+        self.assertIs(self.sample_data1, result)
+        self.assertEqual(expected, result)
+
+    def test_nested_update_many_spreads_lists_per_key(self):
+        document = [{"taco": 42, "salsa": 1}, {"burrito": {"taco": 69, "salsa": 2}}]
+        result = nested_update_many(
+            {"taco": [100, 200], "salsa": ["hot"]}, document, treat_as_element=False
+        )
+        self.assertEqual(
+            [{"taco": 100, "salsa": "hot"}, {"burrito": {"taco": 200, "salsa": "hot"}}],
+            result,
+        )
+        self.assertEqual(42, document[0]["taco"])
+
     def test_nested_update_raise_error(self):
         doc = self.sample_data4
         # get all instances of the given element
@@ -610,6 +799,91 @@ class TestNestedAlter(BaseLookUpApi):
         self.assertIn("renamed", altered_document["key"].keys())
         self.assertIn("renamed", altered_document["key"]["renamed"]["key"].keys())
 
+    def test_nested_alter_calls_back_once_per_occurrence(self):
+        # ordered, the callback is called in the order of the items
+        document = OrderedDict(
+            [
+                (
+                    "key",
+                    OrderedDict(
+                        [("key", [{"key": 1}, {"other": 2}]), ("x", {"key": 3})]
+                    ),
+                ),
+                ("list", [{"KEY_2": 4}]),
+            ]
+        )
+        original = copy.deepcopy(document)
+        seen = []
+
+        def callback(data):
+            seen.append(copy.deepcopy(data))
+            return "altered" if isinstance(data, int) else data
+
+        altered_document = nested_alter(document, "key", callback, wild_alter=True)
+
+        self.assertEqual(original, document)
+        self.assertEqual(
+            [
+                1,
+                [{"key": "altered"}, {"other": 2}],
+                3,
+                {
+                    "key": [{"key": "altered"}, {"other": 2}],
+                    "x": {"key": "altered"},
+                },
+                4,
+            ],
+            seen,
+        )
+        self.assertEqual("altered", altered_document["list"][0]["KEY_2"])
+
+    def test_nested_alter_shared_containers(self):
+        # like the aliases of YAML documents, the containers found on
+        # several paths are altered once
+        for in_place in (False, True):
+            shared = {"k": 1}
+            document = {"a": shared, "b": shared, "c": [shared]}
+            result = nested_alter(document, "k", lambda v: v + 1, in_place=in_place)
+            self.assertEqual({"a": {"k": 2}, "b": {"k": 2}, "c": [{"k": 2}]}, result)
+            self.assertIs(result["a"], result["b"])
+            self.assertEqual({"k": 2} if in_place else {"k": 1}, shared)
+
+            shared = [{"k": 1}, {"k": 2}]
+            document = {"a": shared, "b": {"k": shared}}
+            seen = []
+
+            def callback(value):
+                seen.append(copy.deepcopy(value))
+                return value * 10 if isinstance(value, int) else value
+
+            result = nested_alter(document, "k", callback, in_place=in_place)
+            self.assertEqual([{"k": 10}, {"k": 20}], result["a"])
+            self.assertIs(result["a"], result["b"]["k"])
+            self.assertEqual([1, 2, [{"k": 10}, {"k": 20}]], seen)
+
+    def test_nested_alter_deep_document(self):
+        document = {"key": 0, "pair": (1, [2])}
+        for depth in range(5000):
+            document = {"key": depth, "next": [document]}
+        altered_document = nested_alter(document, "key", str)
+        self.assertEqual(
+            [str(depth) for depth in range(4999, -1, -1)] + ["0"],
+            nested_lookup("key", altered_document),
+        )
+        self.assertEqual(
+            list(range(4999, -1, -1)) + [0], nested_lookup("key", document)
+        )
+        self.assertEqual([(1, [2])], nested_lookup("pair", altered_document))
+        self.assertIsNot(
+            nested_lookup("pair", document)[0],
+            nested_lookup("pair", altered_document)[0],
+        )
+
+    def test_nested_alter_scalar_list(self):
+        document = {"zones": ["mzdfw", "mzfra"], "other": {"zones": []}}
+        altered_document = nested_alter(document, "zones", len)
+        self.assertEqual({"zones": 2, "other": {"zones": 0}}, altered_document)
+
     def test_sample_data4(self):
 
         result = {
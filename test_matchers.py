@@ -0,0 +1,111 @@
+from unittest import TestCase
+
+from nested_lookup import (
+    nested_lookup,
+    nested_lookup_many,
+    nested_alter,
+    get_occurrence_of_key,
+    Matcher,
+    ExactMatcher,
+    WildMatcher,
+    GlobMatcher,
+    RegexMatcher,
+    PrefixMatcher,
+    make_matcher,
+)
+
+
+class CountingMatcher(Matcher):
+    def __init__(self, suffix):
+        super(CountingMatcher, self).__init__()
+        self.suffix = suffix
+        self.calls = 0
+
+    def match(self, key):
+        self.calls += 1
+        return str(key).endswith(self.suffix)
+
+
+class TestMatchers(TestCase):
+    def setUp(self):
+        self.document = {
+            "user_id": 1,
+            "user_name": "Russell",
+            "email": "test1@example.com",
+            "groups": [
+                {"group_id": 10, "Group_Name": "admins", 7: "seven"},
+                {"group_id": 11, "Group_Name": "users", "user_id": None},
+            ],
+        }
+
+    def test_make_matcher(self):
+        self.assertIsInstance(make_matcher("a"), ExactMatcher)
+        self.assertIsInstance(make_matcher("a", wild=True), WildMatcher)
+        self.assertIsInstance(make_matcher("a", wild="substring"), WildMatcher)
+        self.assertIsInstance(make_matcher("a*", wild="glob"), GlobMatcher)
+        self.assertIsInstance(make_matcher("^a", wild="regex"), RegexMatcher)
+        self.assertIsInstance(make_matcher("a", wild="prefix"), PrefixMatcher)
+        matcher = PrefixMatcher("a")
+        self.assertIs(matcher, make_matcher(matcher, wild="glob"))
+        self.assertRaises(ValueError, make_matcher, "a", wild="fuzzy")
+
+    def test_wild_matcher(self):
+        matcher = WildMatcher("NAME")
+        self.assertTrue(matcher("user_name"))
+        self.assertTrue(matcher("Group_Name"))
+        self.assertFalse(matcher("email"))
+        self.assertFalse(matcher(7))
+        self.assertTrue(WildMatcher(7)(7))
+        self.assertTrue(WildMatcher(7)(17))
+
+    def test_nested_lookup_modes(self):
+        self.assertEqual(
+            nested_lookup("name", self.document, wild=True),
+            nested_lookup("name", self.document, wild="substring"),
+        )
+        self.assertEqual(
+            [1, 10, 11, None],
+            nested_lookup("*_id", self.document, wild="glob"),
+        )
+        self.assertEqual(
+            ["admins", "users"],
+            nested_lookup("^group_name$", self.document, wild="regex")
+            + nested_lookup(RegexMatcher("(?i)^group_name$"), self.document),
+        )
+        self.assertEqual(
+            {"user_id": [1, None], "user_name": ["Russell"]},
+            dict(nested_lookup("user", self.document, wild="prefix", with_keys=True)),
+        )
+        self.assertEqual(["seven"], nested_lookup(PrefixMatcher(7), self.document))
+
+    def test_matcher_caches_string_keys(self):
+        matcher = CountingMatcher("_id")
+        documents = [self.document] * 10
+        self.assertEqual([1, 10, 11, None] * 10, nested_lookup(matcher, documents))
+        # every distinct string key is matched once, 7 every time
+        self.assertEqual(6 + 10, matcher.calls)
+
+    def test_nested_lookup_many_modes(self):
+        results = nested_lookup_many(["user*", "*name"], self.document, wild="glob")
+        # several document keys match, their values follow the dict order
+        self.assertEqual(["Russell", 1, None], sorted(results["user*"], key=repr))
+        self.assertEqual(["Russell"], results["*name"])
+
+    def test_get_occurrence_of_key(self):
+        self.assertEqual(3, get_occurrence_of_key(self.document, "_id", wild=True))
+        self.assertEqual(
+            3, get_occurrence_of_key(self.document, GlobMatcher("*_ID", True))
+        )
+        self.assertEqual(
+            [(("groups", 0, 7), "seven")],
+            get_occurrence_of_key(self.document, 7, with_paths=True, wild=True),
+        )
+
+    def test_nested_alter(self):
+        altered = nested_alter(
+            self.document, ["^group_", "^user_id$"], str, wild_alter="regex"
+        )
+        self.assertEqual(["1", "None"], nested_lookup("user_id", altered))
+        self.assertEqual(["10", "11"], nested_lookup("group_id", altered))
+        self.assertEqual(["Russell"], nested_lookup("user_name", altered))
+        self.assertEqual([1, None], nested_lookup("user_id", self.document))
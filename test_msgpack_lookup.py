@@ -0,0 +1,101 @@
+import struct
+from unittest import TestCase
+
+from nested_lookup import (
+    nested_lookup,
+    iter_nested_lookup,
+    nested_lookup_msgpack,
+    GlobMatcher,
+)
+from nested_lookup.msgpack_lookup import ExtType, _bytes_view, _decode
+
+
+def packb(obj):
+    """a small msgpack encoder for the tests"""
+    if obj is None:
+        return b"\xc0"
+    if obj is True or obj is False:
+        return b"\xc3" if obj else b"\xc2"
+    if isinstance(obj, int):
+        if 0 <= obj <= 0x7F or -32 <= obj < 0:
+            return struct.pack(">b" if obj < 0 else ">B", obj)
+        if 0 <= obj <= 0xFFFF:
+            return b"\xcd" + struct.pack(">H", obj)
+        return b"\xd3" + struct.pack(">q", obj)
+    if isinstance(obj, float):
+        return b"\xcb" + struct.pack(">d", obj)
+    if isinstance(obj, str):
+        data = obj.encode("utf-8")
+        if len(data) <= 31:
+            return struct.pack(">B", 0xA0 | len(data)) + data
+        return b"\xda" + struct.pack(">H", len(data)) + data
+    if isinstance(obj, bytes):
+        return b"\xc4" + struct.pack(">B", len(obj)) + obj
+    if isinstance(obj, ExtType):
+        return b"\xc7" + struct.pack(">Bb", len(obj.data), obj.code) + obj.data
+    if isinstance(obj, list):
+        header = (
+            struct.pack(">B", 0x90 | len(obj))
+            if len(obj) <= 15
+            else (b"\xdc" + struct.pack(">H", len(obj)))
+        )
+        return header + b"".join(packb(item) for item in obj)
+    if isinstance(obj, dict):
+        header = (
+            struct.pack(">B", 0x80 | len(obj))
+            if len(obj) <= 15
+            else (b"\xde" + struct.pack(">H", len(obj)))
+        )
+        return header + b"".join(packb(k) + packb(v) for k, v in obj.items())
+    raise TypeError(obj)
+
+
+class TestNestedLookupMsgpack(TestCase):
+    def setUp(self):
+        self.document = {
+            "name": "root",
+            "id": 70000,
+            "score": -1.5,
+            "big": -(2**40),
+            "blob": b"\x00\x01",
+            "ext": ExtType(5, b"abc"),
+            "flags": [True, False, None, -3],
+            "children": [
+                {"name": {"name": "nested", "tags": ["a"] * 20}},
+                {"Name": "wild", 7: "int key", "long": "x" * 40},
+            ],
+            "wide": dict(("key_%d" % i, i) for i in range(20)),
+        }
+        self.data = packb(self.document)
+
+    def test_decode_round_trip(self):
+        self.assertEqual(
+            (self.document, len(self.data)), _decode(_bytes_view(self.data), 0)
+        )
+
+    def test_same_values_as_nested_lookup(self):
+        for key in ("name", "tags", "flags", "blob", "ext", 7, "key_19", "missing"):
+            self.assertEqual(
+                nested_lookup(key, self.document),
+                list(nested_lookup_msgpack(key, self.data)),
+            )
+
+    def test_wild_and_with_keys(self):
+        self.assertEqual(
+            list(iter_nested_lookup("NAM", self.document, wild=True, with_keys=True)),
+            list(nested_lookup_msgpack("NAM", self.data, wild=True, with_keys=True)),
+        )
+        self.assertEqual(
+            ["root", {"name": "nested", "tags": ["a"] * 20}, "nested"],
+            list(nested_lookup_msgpack(GlobMatcher("n*"), self.data)),
+        )
+
+    def test_buffers(self):
+        for buffer in (bytearray(self.data), memoryview(self.data)):
+            self.assertEqual(["a"] * 20, list(nested_lookup_msgpack("tags", buffer))[0])
+
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            list(nested_lookup_msgpack("name", self.data[:-3]))
+        with self.assertRaises(ValueError):
+            list(nested_lookup_msgpack("name", b"\x81\xa1a\xc1"))
@@ -1,14 +1,36 @@
+import threading
+from collections import OrderedDict
 from unittest import TestCase
 
 from nested_lookup import (
     nested_lookup,
+    iter_nested_lookup,
+    nested_find_first,
+    nested_contains,
+    nested_lookup_many,
     get_all_keys,
+    iter_all_keys,
     get_occurrence_of_key,
     get_occurrence_of_value,
-    get_occurrences_and_values
+    get_occurrences_and_values,
+    nested_find_values,
+    RegexMatcher,
+    collect_stats,
+    register_container,
+    unregister_container,
+    use_speedups,
 )
 
 
+class ExplodingDict(dict):
+    """a dict which must not be walked"""
+
+    def items(self):
+        raise AssertionError("walked too far")
+
+    iteritems = items
+
+
 class TestNestedLookup(TestCase):
     def setUp(self):
         self.subject_dict = {"a": 1, "b": {"d": 100}, "c": {"d": 200}}
@@ -131,6 +153,203 @@ class TestNestedLookup(TestCase):
         }
         self.assertIn(match2, result)
 
+    def test_nested_lookup_deep_document(self):
+        document = {"d": "bottom"}
+        for depth in range(5000):
+            document = {"d": depth, "next": [document]}
+        results = nested_lookup("d", document)
+        self.assertEqual(5001, len(results))
+        self.assertEqual(4999, results[0])
+        self.assertEqual("bottom", results[-1])
+        self.assertEqual(10001, len(get_all_keys(document)))
+        self.assertEqual(5001, get_occurrence_of_key(document, "d"))
+        self.assertEqual(1, get_occurrence_of_value(document, "bottom"))
+
+    def test_document_containing_itself(self):
+        document = {"a": 1}
+        document["b"] = [{"c": document}]
+        for function in [
+            lambda: nested_lookup("a", document),
+            lambda: list(iter_nested_lookup("a", document, wild=True)),
+            lambda: get_all_keys(document),
+            lambda: get_occurrence_of_key(document, "a"),
+            lambda: get_occurrence_of_value(document, 1),
+        ]:
+            self.assertRaises(ValueError, function)
+        # walks which do not get deep enough still work
+        self.assertEqual([1], nested_lookup("a", document, max_depth=2))
+        self.assertEqual(1, nested_find_first("a", document))
+
+    def test_nested_lookup_with_paths(self):
+        document = [{}, {"H": [self.subject_dict3]}]
+        results = nested_lookup("build_version", document, with_paths=True)
+        self.assertEqual(
+            nested_lookup("build_version", document), [v for _, v in results]
+        )
+        self.assertEqual(
+            [
+                (1, "H", 0, "build_version"),
+                (1, "H", 0, "build_version", "build_version"),
+                (
+                    1,
+                    "H",
+                    0,
+                    "build_version",
+                    "build_version",
+                    "core_details",
+                    "build_version",
+                ),
+                (1, "H", 0, "os_details", "build_version"),
+            ],
+            [path for path, _ in results],
+        )
+
+    def test_wild_nested_lookup_with_keys_and_paths(self):
+        matches = nested_lookup(
+            "mail", self.subject_dict2, wild=True, with_keys=True, with_paths=True
+        )
+        self.assertEqual(
+            [
+                (("email_address",), "test1@example.com"),
+                (("other", "email_address"), "test4@example.com"),
+            ],
+            sorted(matches["email_address"]),
+        )
+        self.assertEqual(
+            [(("other", "EMAIL_RECOVERY"), "test3@example.com")],
+            matches["EMAIL_RECOVERY"],
+        )
+
+    def test_nested_lookup_max_depth(self):
+        document = [{}, {"H": [self.subject_dict3]}]
+        self.assertEqual([], nested_lookup("build_version", document, max_depth=2))
+        self.assertEqual(
+            [self.subject_dict3["build_version"]],
+            nested_lookup("build_version", self.subject_dict3, max_depth=0),
+        )
+        self.assertEqual(
+            [
+                self.subject_dict3["build_version"],
+                self.subject_dict3["build_version"]["build_version"],
+                "17G65",
+            ],
+            nested_lookup("build_version", self.subject_dict3, max_depth=1),
+        )
+        self.assertEqual(
+            nested_lookup("build_version", document),
+            nested_lookup("build_version", document, max_depth=6),
+        )
+        self.assertEqual(3, len(nested_lookup("build_version", document, max_depth=5)))
+
+    def test_nested_lookup_prune(self):
+        self.assertEqual(
+            [self.subject_dict3["build_version"], "17G65"],
+            nested_lookup("build_version", self.subject_dict3, prune={"build_version"}),
+        )
+        self.assertEqual(
+            [self.subject_dict3["build_version"], "17G65"],
+            nested_lookup(
+                "build_version",
+                self.subject_dict3,
+                prune=lambda key, value: key != "os_details",
+            ),
+        )
+
+    def test_nested_lookup_prune_single_key(self):
+        document = {"blob": {"b": 1, "o": 2}, "b": {"b": 3}}
+        # a string is one key, not the set of its characters
+        self.assertEqual([{"b": 3}, 3], nested_lookup("b", document, prune="blob"))
+        self.assertEqual(
+            [{"b": 1, "o": 2}], nested_lookup("blob", document, prune="blob")
+        )
+        document = {("b",): {"b": 1}, "b": 3}
+        self.assertEqual([3], nested_lookup("b", document, prune=("b",)))
+
+    def test_nested_lookup_scalar_lists(self):
+        document = {"a": [1, "x", None, 2.5], "b": [[], [3, [{"a": 4}]]], "c": []}
+        self.assertEqual([[1, "x", None, 2.5], 4], nested_lookup("a", document))
+
+    def test_nested_lookup_without_options(self):
+        # the plain lookup does not go through walk, it finds the same
+        # values in the same order
+        self.addCleanup(use_speedups, use_speedups(False))
+        self.addCleanup(unregister_container, tuple)
+        register_container(tuple)
+        documents = [
+            {},
+            "scalar",
+            [{"a": [1, 2, "a"]}, {"b": "a", "a": {"a": 1}}, 1, [[{"a": "a"}]]],
+            {"a": ({"a": 1},), "b": ["x", {"y": [{"a": 5}, {"a": 6}]}]},
+            self.subject_dict3,
+        ]
+        for document in documents:
+            for key in ["a", "build_version", "missing"]:
+                self.assertEqual(
+                    list(iter_nested_lookup(key, document)),
+                    nested_lookup(key, document),
+                )
+
+    def test_early_exit(self):
+        document = [{"d": 1}, {"e": {"d": 2}}, ExplodingDict(d=3)]
+        self.assertEqual([1, 2], nested_lookup("d", document, limit=2))
+        self.assertEqual(
+            {"d": [1]}, nested_lookup("d", document, with_keys=True, limit=1)
+        )
+        self.assertEqual(1, nested_find_first("d", document))
+        self.assertEqual(
+            ((1, "e"), {"d": 2}), nested_find_first("e", document, with_paths=True)
+        )
+        self.assertTrue(nested_contains("e", document))
+        # the keyword arguments of nested_lookup are taken, limit included
+        self.assertEqual(1, nested_find_first("d", document, limit=5))
+        self.assertTrue(nested_contains("d", document, limit=1))
+        self.assertEqual(0, nested_find_first("d", document, 0, limit=0))
+        self.assertFalse(nested_contains("d", document, limit=0))
+        results = iter_nested_lookup("d", document)
+        self.assertEqual(1, next(results))
+        self.assertEqual(2, next(results))
+        self.assertRaises(AssertionError, next, results)
+
+    def test_early_exit_missing_key(self):
+        self.assertIsNone(nested_find_first("missing", self.subject_dict))
+        self.assertEqual(0, nested_find_first("missing", self.subject_dict, 0))
+        self.assertFalse(nested_contains("missing", self.subject_dict))
+        self.assertTrue(nested_contains("A", self.subject_dict, wild=True))
+        self.assertEqual([], nested_lookup("d", self.subject_dict, limit=0))
+
+    def test_nested_lookup_many(self):
+        keys = ["d", "a", "missing"]
+        results = nested_lookup_many(keys, self.subject_dict)
+        self.assertEqual(set(keys), set(results))
+        for key in keys:
+            self.assertEqual(nested_lookup(key, self.subject_dict), results[key])
+
+    def test_nested_lookup_many_keeps_order(self):
+        keys = ["build_version", "memory", "name"]
+        results = nested_lookup_many(keys, [self.subject_dict3, self.subject_dict3])
+        for key in keys:
+            self.assertEqual(
+                nested_lookup(key, [self.subject_dict3, self.subject_dict3]),
+                results[key],
+            )
+
+    def test_nested_lookup_many_wild_with_keys(self):
+        keys = ["mail", "EMAIL_ADDRESS", "name"]
+        results = nested_lookup_many(
+            keys, self.subject_dict2, wild=True, with_keys=True
+        )
+        for key in keys:
+            self.assertEqual(
+                nested_lookup(key, self.subject_dict2, wild=True, with_keys=True),
+                results[key],
+            )
+
+    def test_nested_lookup_many_non_str_keys(self):
+        results = nested_lookup_many([2, 3, "C"], self.subject_dict4)
+        self.assertEqual([{"b": 44, "C": 55}], results[2])
+        self.assertEqual(["d"], results[3])
+        self.assertEqual([55], results["C"])
+
 
 class TestGetAllKeys(TestCase):
     def setUp(self):
@@ -273,6 +492,35 @@ class TestGetAllKeys(TestCase):
         for key in keys_to_verify:
             self.assertIn(key, result)
 
+    def test_iter_all_keys_is_lazy(self):
+        document = [{"a": 1, "b": {"a": 2}}, ExplodingDict(c=3)]
+        keys = iter_all_keys(document)
+        self.assertEqual(["a", "b", "a"], [next(keys) for _ in range(3)])
+        self.assertEqual(get_all_keys(self.sample1), list(iter_all_keys(self.sample1)))
+
+    def test_unique(self):
+        document = {"a": [{"a": 1, "b": 2}, {"b": {"c": 3}}]}
+        self.assertEqual(["a", "b", "c"], get_all_keys(document, unique=True))
+        self.assertEqual(
+            [("a", 0), ("a", 2), ("b", 2), ("c", 3)],
+            list(iter_all_keys(document, unique=True, with_depth=True)),
+        )
+
+    def test_with_depth_and_paths(self):
+        document = {"a": [{"a": 1}, [{"b": 2}]], "c": {"d": 3}}
+        self.assertEqual(
+            [("a", 0), ("a", 2), ("b", 3), ("c", 0), ("d", 1)],
+            get_all_keys(document, with_depth=True),
+        )
+        self.assertEqual(
+            [("a",), ("a", 0, "a"), ("a", 1, 0, "b"), ("c",), ("c", "d")],
+            get_all_keys(document, with_paths=True),
+        )
+        self.assertEqual(
+            [(("c",), 0), (("c", "d"), 1)],
+            get_all_keys({"c": {"d": 3}}, with_depth=True, with_paths=True),
+        )
+
 
 class TestGetOccurrence(TestCase):
     def setUp(self):
@@ -416,6 +664,33 @@ class TestGetOccurrence(TestCase):
         self.sample5["memory"] = 0
         self.assertEqual(2, get_occurrence_of_key(self.sample5, "memory"))
 
+    def test_occurrences_with_paths(self):
+        paths = get_occurrence_of_key(self.sample3, "total_number_of_cores", True)
+        self.assertEqual(
+            [
+                ("hardware_details", "processor_details", 0, "total_number_of_cores"),
+                ("hardware_details", "processor_details", 1, "total_number_of_cores"),
+                ("hardware_details", "total_number_of_cores"),
+            ],
+            [path for path, _ in paths],
+        )
+        self.assertEqual(["4"] * 3, [value for _, value in paths])
+        paths = get_occurrence_of_value(self.sample4, "mziad", with_paths=True)
+        self.assertEqual(
+            [(("values", 0, "checks", 0, "monitoring_zones", 3), "mziad")], paths
+        )
+        for sample in [self.sample1, self.sample2, self.sample3, self.sample5]:
+            for key in ["build_version", "memory", "total_number_of_cores"]:
+                self.assertEqual(
+                    get_occurrence_of_key(sample, key),
+                    len(get_occurrence_of_key(sample, key, with_paths=True)),
+                )
+            for value in ["4", "256 KB", 0, False]:
+                self.assertEqual(
+                    get_occurrence_of_value(sample, value),
+                    len(get_occurrence_of_value(sample, value, with_paths=True)),
+                )
+
     def test_sample_data6(self):
         value = '4'
         result = get_occurrences_and_values(self.sample6, value)
@@ -434,6 +709,69 @@ class TestGetOccurrence(TestCase):
         self.assertEqual(4, result[value]['occurrences'])
         self.assertEqual(4, len(result[value]['values']))
 
+    def test_get_occurrences_and_values_values_once_per_dict(self):
+        items = [{"a": "4", "b": {"c": "4"}, "d": "4"}, [{"e": ["4", "4"]}]]
+        result = get_occurrences_and_values(items, "4")
+        self.assertEqual(5, result["4"]["occurrences"])
+        self.assertEqual([items[0], items[0]["b"]], result["4"]["values"])
+
+    def test_occurrences_from_many_threads(self):
+        samples = [self.sample1, self.sample2, self.sample3, self.sample4]
+        samples += [self.sample5, self.sample6, self.sample7]
+        jobs = [
+            (get_occurrences_and_values, ([sample], value))
+            for sample in samples
+            for value in ["4", "256 KB", "mziad", "2.7 GHz"]
+        ]
+        jobs += [
+            (get_occurrence_of_value, (sample, value))
+            for sample in samples
+            for value in ["4", "16 GB"]
+        ]
+        jobs += [
+            (get_occurrence_of_key, (sample, key))
+            for sample in samples
+            for key in ["memory", "total_number_of_cores"]
+        ]
+        expected = [function(*args) for function, args in jobs]
+        failures = []
+
+        def worker():
+            for _ in range(20):
+                for (function, args), result in zip(jobs, expected):
+                    if function(*args) != result:
+                        failures.append((function, args))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], failures)
+
+    def test_counts_without_walk(self):
+        # without stats the counts and the keys do not go through walk,
+        # they are the same as the ones found by the walk
+        self.addCleanup(use_speedups, use_speedups(False))
+        samples = [self.sample1, self.sample5, self.sample7]
+        samples += [[{"a": [1, ["4"]], "b": {"c": "4"}}, "4", [None, {"a": None}]]]
+        for sample in samples:
+            for keyword in ["4", "a", "memory", None, "missing"]:
+                with collect_stats():
+                    expected = (
+                        get_occurrence_of_key(sample, keyword),
+                        get_occurrence_of_value(sample, keyword),
+                        get_all_keys(sample),
+                    )
+                self.assertEqual(
+                    expected,
+                    (
+                        get_occurrence_of_key(sample, keyword),
+                        get_occurrence_of_value(sample, keyword),
+                        get_all_keys(sample),
+                    ),
+                )
+
     def test_sample_data9(self):
         value = '5'
         result = get_occurrences_and_values(self.sample7, value)
@@ -441,5 +779,60 @@ class TestGetOccurrence(TestCase):
         self.assertEqual(0, len(result[value]['values']))
 
 
+class TestNestedFindValues(TestCase):
+    def setUp(self):
+        # ordered, the values are found in the order of the items
+        self.document = OrderedDict(
+            [
+                ("name", "a"),
+                (
+                    "links",
+                    ["http://x", OrderedDict([("url", "https://y"), ("name", "b")])],
+                ),
+                (
+                    "nested",
+                    OrderedDict(
+                        [("name", "a"), ("count", 1), ("items", [1, "a", ["a"]])]
+                    ),
+                ),
+            ]
+        )
+
+    def test_value(self):
+        document = self.document
+        self.assertEqual(
+            [
+                (document, "name", "a", ("name",)),
+                (document["nested"], "name", "a", ("nested", "name")),
+                (document["nested"]["items"], 1, "a", ("nested", "items", 1)),
+                (document["nested"]["items"][2], 0, "a", ("nested", "items", 2, 0)),
+            ],
+            list(nested_find_values("a", document)),
+        )
+        self.assertEqual(
+            [(document["nested"], "count", 1), (document["nested"]["items"], 0, 1)],
+            list(nested_find_values(1, document, with_paths=False)),
+        )
+        self.assertEqual([], list(nested_find_values("missing", document)))
+
+    def test_predicate(self):
+        found = nested_find_values(RegexMatcher("^https?://"), self.document)
+        self.assertEqual(
+            [("links", 0), ("links", 1, "url")], [path for _, _, _, path in found]
+        )
+        found = nested_find_values(lambda v: isinstance(v, int), self.document)
+        self.assertEqual([1, 1], [value for _, _, value, _ in found])
+
+    def test_only_scalars(self):
+        document = {"a": ["a"], "b": {"c": 1}}
+        self.assertEqual([], list(nested_find_values(["a"], document)))
+        self.assertEqual([], list(nested_find_values({"c": 1}, document)))
+        self.assertEqual(2, len(list(nested_find_values(lambda v: True, document))))
+
+    def test_lazy(self):
+        document = [1, ExplodingDict(a=1)]
+        self.assertEqual((document, 0, 1), next(nested_find_values(1, document, False)))
+
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,295 @@
+import pickle
+import random
+from unittest import TestCase
+
+from nested_lookup import (
+    nested_lookup,
+    nested_update,
+    nested_update_many,
+    nested_delete,
+    nested_alter,
+    get_all_keys,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    compile_lookup,
+    use_speedups,
+    freeze,
+    thaw,
+    PersistentMap,
+    PersistentVector,
+)
+from nested_lookup import speedups
+
+
+class Colliding(object):
+    """a key whose hash collides with the hashes of many other keys"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return self.value % 3
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.value == self.value
+
+    def __repr__(self):
+        return "Colliding(%d)" % self.value
+
+
+class TestPersistentMap(TestCase):
+    def test_same_as_dict(self):
+        rng = random.Random(7)
+        expected = {}
+        persistent = PersistentMap()
+        versions = []
+        for _ in range(2000):
+            key = rng.choice(
+                [
+                    rng.randint(0, 200),
+                    str(rng.randint(0, 50)),
+                    Colliding(rng.randint(0, 30)),
+                ]
+            )
+            if expected and rng.random() < 0.3:
+                key = rng.choice(list(expected))
+                del expected[key]
+                persistent = persistent.delete(key)
+            else:
+                expected[key] = rng.random()
+                persistent = persistent.set(key, expected[key])
+            versions.append((dict(expected), persistent))
+        for expected, persistent in versions[::50]:
+            self.assertEqual(expected, persistent)
+            self.assertEqual(len(expected), len(persistent))
+            self.assertEqual(sorted(map(repr, expected)), sorted(map(repr, persistent)))
+            for key, value in expected.items():
+                self.assertIn(key, persistent)
+                self.assertEqual(value, persistent[key])
+
+    def test_old_versions_stay(self):
+        first = PersistentMap(a=1, b={"c": 2})
+        second = first.set("a", 2).delete("b")
+        self.assertEqual({"a": 1, "b": {"c": 2}}, first)
+        self.assertEqual({"a": 2}, second)
+        self.assertIs(first, first.set("a", 1))
+
+    def test_missing_keys(self):
+        persistent = PersistentMap(a=1)
+        self.assertRaises(KeyError, persistent.__getitem__, "b")
+        self.assertRaises(KeyError, persistent.delete, "b")
+        self.assertEqual(None, persistent.get("b"))
+        self.assertEqual(PersistentMap(), persistent.delete("a"))
+
+    def test_evolver(self):
+        persistent = PersistentMap(a=1, b=2)
+        evolver = persistent.evolver()
+        evolver["a"] = 3
+        del evolver["b"]
+        self.assertNotIn("b", evolver)
+        self.assertRaises(KeyError, evolver.__delitem__, "b")
+        self.assertEqual({"a": 3}, evolver.persistent())
+        self.assertEqual({"a": 1, "b": 2}, persistent)
+
+    def test_pickle(self):
+        persistent = freeze({"a": [1, {"b": 2}]})
+        self.assertEqual(persistent, pickle.loads(pickle.dumps(persistent)))
+
+
+class TestPersistentVector(TestCase):
+    def test_same_as_list(self):
+        for size in [0, 1, 31, 32, 33, 1024, 1025, 33000]:
+            expected = list(range(size))
+            self.assertEqual(expected, PersistentVector(expected))
+            appended = PersistentVector()
+            for value in expected[:2000]:
+                appended = appended.append(value)
+            self.assertEqual(expected[:2000], appended)
+            if size:
+                changed = PersistentVector(expected).set(size // 2, "x")
+                self.assertEqual("x", changed[size // 2])
+                self.assertEqual("x", changed[size // 2 - size])
+                self.assertEqual(size, len(changed))
+
+    def test_old_versions_stay(self):
+        first = PersistentVector([1, 2])
+        second = first.append(3).set(0, 0)
+        self.assertEqual([1, 2], first)
+        self.assertEqual([0, 2, 3], second)
+        self.assertNotEqual(first, second)
+        self.assertRaises(IndexError, first.set, 2, 0)
+        self.assertRaises(IndexError, first.__getitem__, -3)
+
+
+class TestPersistentDocument(TestCase):
+    def setUp(self):
+        self.plain = {
+            "name": "root",
+            "servers": [
+                {"name": "a", "port": 80, "tags": ["x", {"name": "t"}]},
+                {"name": "b", "port": 81},
+            ],
+            "limits": {"timeout": 10, "retry": {"timeout": 1}},
+        }
+        self.document = freeze(self.plain)
+
+    def test_freeze_and_thaw(self):
+        self.assertIsInstance(self.document, PersistentMap)
+        self.assertIsInstance(self.document["servers"], PersistentVector)
+        self.assertEqual(self.plain, self.document)
+        thawed = thaw(self.document)
+        self.assertEqual(self.plain, thawed)
+        self.assertIsInstance(thawed["servers"][0]["tags"], list)
+        self.assertEqual("scalar", freeze("scalar"))
+
+    def test_lookups(self):
+        for key in ["name", "timeout", "port", "missing"]:
+            self.assertEqual(
+                sorted(map(repr, nested_lookup(key, self.plain))),
+                sorted(map(repr, nested_lookup(key, self.document))),
+            )
+            self.assertEqual(
+                get_occurrence_of_key(self.plain, key),
+                get_occurrence_of_key(self.document, key),
+            )
+            self.assertEqual(
+                nested_lookup(key, self.document), compile_lookup(key)(self.document)
+            )
+        self.assertEqual(
+            sorted(get_all_keys(self.plain)), sorted(get_all_keys(self.document))
+        )
+        self.assertEqual(1, get_occurrence_of_value(self.document, "x"))
+        self.assertEqual(
+            nested_lookup("PORT", self.plain, wild=True, max_depth=1),
+            nested_lookup("PORT", self.document, wild=True, max_depth=1),
+        )
+
+    def test_lookups_without_speedups(self):
+        if speedups.available():
+            self.addCleanup(use_speedups, use_speedups(False))
+        self.test_lookups()
+
+    def test_update(self):
+        updated = nested_update(self.document, "timeout", 30)
+        self.assertEqual(self.plain, self.document)
+        self.assertIsInstance(updated, PersistentMap)
+        self.assertEqual([30, 30], nested_lookup("timeout", updated))
+        # only the paths to the changes are new
+        self.assertIs(self.document["servers"], updated["servers"])
+        self.assertIsNot(self.document["limits"], updated["limits"])
+
+        updated = nested_update(self.document, "port", [1, 2], treat_as_element=False)
+        self.assertEqual([1, 2], nested_lookup("port", updated))
+        self.assertIs(
+            self.document["servers"][0]["tags"], updated["servers"][0]["tags"]
+        )
+
+    def test_update_many(self):
+        updated = nested_update_many({"port": 0, "retry": None}, self.document)
+        self.assertEqual([0, 0], nested_lookup("port", updated))
+        self.assertEqual([10], nested_lookup("timeout", updated))
+        self.assertEqual(self.plain, self.document)
+
+    def test_delete(self):
+        deleted = nested_delete(self.document, "name")
+        self.assertEqual([], nested_lookup("name", deleted))
+        self.assertEqual(self.plain, self.document)
+        self.assertIs(self.document["limits"], deleted["limits"])
+        self.assertEqual(thaw(nested_delete(self.plain, "name")), thaw(deleted))
+
+    def test_alter(self):
+        altered = nested_alter(self.document, "timeout", lambda v: v * 2)
+        self.assertEqual(self.plain, self.document)
+        self.assertEqual(
+            sorted(
+                nested_lookup(
+                    "timeout", nested_alter(self.plain, "timeout", lambda v: v * 2)
+                )
+            ),
+            sorted(nested_lookup("timeout", altered)),
+        )
+        self.assertIs(self.document["servers"], altered["servers"])
+
+        # containers are given to the callback once the keys in them were
+        # altered
+        altered = nested_alter(self.document, ["retry", "timeout"], thaw)
+        self.assertEqual({"timeout": 1}, altered["limits"]["retry"])
+        self.assertIsInstance(altered["limits"]["retry"], dict)
+
+    def test_alter_nested_matches(self):
+        document = freeze({"a": [{"a": 0}], "b": {"a": {"c": {"a": 1}}}})
+        seen = []
+
+        def increment(value):
+            seen.append(value)
+            return value if not isinstance(value, int) else value + 1
+
+        altered = nested_alter(document, "a", increment)
+        # the containers given to the callback and the result hold no
+        # evolvers
+        for value in seen + [altered]:
+            for found in nested_lookup("a", value):
+                self.assertIsInstance(found, (int, PersistentMap, PersistentVector))
+        self.assertEqual({"a": [{"a": 1}], "b": {"a": {"c": {"a": 2}}}}, altered)
+        self.assertEqual({"a": [{"a": 0}], "b": {"a": {"c": {"a": 1}}}}, document)
+
+    def test_alter_shared_containers(self):
+        shared = freeze({"k": 1, "x": {"k": 5}})
+        document = freeze({"a": shared, "b": shared, "c": [shared]})
+        altered = nested_alter(document, "k", lambda v: v + 1)
+        expected = {"k": 2, "x": {"k": 6}}
+        self.assertEqual({"a": expected, "b": expected, "c": [expected]}, altered)
+        self.assertEqual({"k": 1, "x": {"k": 5}}, shared)
+
+    def test_plain_containers_inside(self):
+        document = nested_update(self.document, "retry", {"timeout": 2, "x": []})
+        updated = nested_update(document, "timeout", 3)
+        self.assertEqual({"timeout": 3, "x": []}, updated["limits"]["retry"])
+        self.assertEqual({"timeout": 2, "x": []}, document["limits"]["retry"])
+
+    def test_not_in_place(self):
+        self.assertRaises(
+            TypeError, nested_update, self.document, "port", 1, in_place=True
+        )
+        self.assertRaises(
+            TypeError, nested_delete, self.document, "port", in_place=True
+        )
+        self.assertRaises(
+            TypeError,
+            nested_alter,
+            self.document,
+            "port",
+            str,
+            in_place=True,
+        )
+        self.assertEqual(self.plain, self.document)
+
+    def test_not_in_place_inside(self):
+        # nothing is written when a persistent container holds the key
+        document = {"x": {"a": 0}, "y": [{"a": 1}], "cfg": freeze({"a": 2})}
+        values = [3, 4, 5]
+        for function in [
+            lambda: nested_update(document, "a", 3, in_place=True),
+            lambda: nested_update_many({"a": 3}, document, in_place=True),
+            lambda: nested_delete(document, "a", in_place=True),
+            lambda: nested_delete(document, ["a"], in_place=True),
+            lambda: nested_alter(document, "a", str, in_place=True),
+            lambda: nested_update(
+                document, "a", values, in_place=True, treat_as_element=False
+            ),
+        ]:
+            self.assertRaises(TypeError, function)
+            self.assertEqual(
+                {"x": {"a": 0}, "y": [{"a": 1}], "cfg": {"a": 2}}, document
+            )
+            self.assertEqual([3, 4, 5], values)
+        # persistent containers without the key are not written to
+        nested_update(document, "x", None, in_place=True)
+        self.assertEqual({"x": None, "y": [{"a": 1}], "cfg": {"a": 2}}, document)
+
+    def test_plain_document_with_persistent_inside(self):
+        document = {"x": {"a": 0}, "cfg": freeze({"a": 1})}
+        altered = nested_alter(document, "a", lambda v: v + 1)
+        self.assertEqual({"x": {"a": 1}, "cfg": {"a": 2}}, altered)
+        self.assertIsInstance(altered["cfg"], PersistentMap)
+        self.assertEqual({"x": {"a": 0}, "cfg": {"a": 1}}, document)
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from nested_lookup import (
+    nested_lookup,
+    nested_lookup_many,
+    compile_lookup,
+    collect_stats,
+    LookupPlan,
+    PrefixMatcher,
+    use_speedups,
+)
+from nested_lookup import plan, speedups
+
+
+class TestCompileLookup(TestCase):
+    def setUp(self):
+        self.documents = [
+            {"id": i, "user": {"Name": "user%d" % i, "groups": [{"id": i * 10}]}}
+            for i in range(5)
+        ] + [[{"name": {"name": "x"}}], {}, "scalar"]
+
+    def test_same_as_nested_lookup(self):
+        for key, options in [
+            ("id", {}),
+            ("NAME", {"wild": True}),
+            ("name", {"with_keys": True}),
+            ("NA*", {"wild": "glob", "with_keys": True}),
+            (PrefixMatcher("gr"), {}),
+            ("id", {"max_depth": 1}),
+        ]:
+            lookup = compile_lookup(key, **options)
+            self.assertIsInstance(lookup, LookupPlan)
+            for document in self.documents:
+                self.assertEqual(
+                    nested_lookup(key, document, **options), lookup(document)
+                )
+
+    def test_many_keys(self):
+        for keys, options in [
+            (["id", "name", "id"], {}),
+            (["NAME", "i"], {"wild": True, "with_keys": True}),
+        ]:
+            lookup = compile_lookup(keys, **options)
+            for document in self.documents:
+                self.assertEqual(
+                    nested_lookup_many(keys, document, **options), lookup(document)
+                )
+
+    def test_stats(self):
+        lookup = compile_lookup("id")
+        with collect_stats() as stats:
+            self.assertEqual([0, 0], lookup(self.documents[0]))
+        self.assertEqual(2, stats.matches)
+        self.assertEqual(5, stats.nodes)
+        self.assertIn("'id'", repr(lookup))
+
+    def test_exact_plan_skips_the_walk(self):
+        # without the C speedups, a plan of one key runs the loop of
+        # nested_lookup rather than the generic walk, to stay as cheap
+        if speedups.available():
+            self.addCleanup(use_speedups, use_speedups(False))
+
+        def walk(*args):
+            raise AssertionError("walked with the generic walk")
+
+        self.addCleanup(setattr, plan, "_walk", plan._walk)
+        plan._walk = walk
+        lookup = compile_lookup("id")
+        for document in self.documents:
+            self.assertEqual(nested_lookup("id", document), lookup(document))
+        self.assertRaises(AssertionError, compile_lookup("id", max_depth=1), {})
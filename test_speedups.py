@@ -0,0 +1,134 @@
+import copy
+from unittest import TestCase, skipUnless
+
+import test_lookup_api
+import test_nested_lookup
+from nested_lookup import (
+    nested_lookup,
+    nested_delete,
+    nested_update_many,
+    get_all_keys,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    compile_lookup,
+    collect_stats,
+    register_container,
+    unregister_container,
+    use_speedups,
+)
+from nested_lookup import speedups
+
+
+class UserDict(dict):
+    pass
+
+
+class UserList(list):
+    pass
+
+
+DOCUMENTS = [
+    {},
+    [],
+    "scalar",
+    {"a": 1, "b": {"a": 2, "c": [{"a": 3}, {"a": None}, [1, {"a": {"a": 4}}]]}},
+    [{"a": [1, 2, "a"]}, {"b": "a", "a": {"b": 1}}, 1, "a", [[{"a": "a"}]]],
+    {1: "a", (1, 2): {1: [1, 1.0, True]}, "x": {"x": {"x": {"x": None}}}},
+    UserDict(a=UserList([UserDict(a=1), 2]), b=UserDict(c={"a": "a"})),
+    {"a": ({"a": 1},), "b": ["x", {"y": [{"a": 5}, {"a": 6}]}]},
+]
+
+
+@skipUnless(speedups.available(), "the C speedups are not built")
+class TestSpeedups(TestCase):
+    def setUp(self):
+        self.addCleanup(use_speedups, use_speedups(True))
+
+    def both(self, function, document):
+        """return the results of the function with and without speedups"""
+        fast_document = copy.deepcopy(document)
+        fast = function(fast_document)
+        use_speedups(False)
+        try:
+            slow_document = copy.deepcopy(document)
+            slow = function(slow_document)
+        finally:
+            use_speedups(True)
+        self.assertEqual(fast_document, slow_document)
+        return fast, slow
+
+    def assertSame(self, function):
+        for document in DOCUMENTS:
+            fast, slow = self.both(function, document)
+            self.assertEqual(fast, slow, document)
+
+    def test_lookup(self):
+        for key in ["a", "x", 1, (1, 2), "missing"]:
+            self.assertSame(lambda d: nested_lookup(key, d))
+            self.assertSame(lambda d: compile_lookup(key)(d))
+
+    def test_all_keys(self):
+        self.assertSame(get_all_keys)
+
+    def test_occurrences(self):
+        for key in ["a", "x", 1]:
+            self.assertSame(lambda d: get_occurrence_of_key(d, key))
+        for value in ["a", 1, None, {"a": 1}]:
+            self.assertSame(lambda d: get_occurrence_of_value(d, value))
+
+    def test_delete_in_place(self):
+        for key in ["a", "x", 1, "missing"]:
+            self.assertSame(lambda d: nested_delete(d, key, in_place=True))
+
+    def test_update_in_place(self):
+        updates = {"a": [10, 20], "x": ["y"], "c": [[{"a": 0}]]}
+        self.assertSame(
+            lambda d: nested_update_many(copy.deepcopy(updates), d, in_place=True)
+        )
+
+    def test_same_objects(self):
+        document = {"a": {"b": 1}}
+        self.assertIs(nested_lookup("a", document)[0], document["a"])
+
+    def test_errors_propagate(self):
+        document = {"a": [test_nested_lookup.ExplodingDict(a=1)]}
+        self.assertRaises(AssertionError, nested_lookup, "a", document)
+
+    def test_not_used_with_stats(self):
+        with collect_stats() as stats:
+            nested_lookup("a", DOCUMENTS[3])
+        self.assertGreater(stats.nodes, 0)
+
+    def test_not_used_with_registered_containers(self):
+        register_container(tuple)
+        self.addCleanup(unregister_container, tuple)
+        self.assertIsNone(speedups.fast())
+        self.assertEqual(nested_lookup("a", DOCUMENTS[7])[:2], [({"a": 1},), 1])
+
+
+# the tests of the pure Python walks, run with the speedups turned off
+class PurePython(object):
+    def setUp(self):
+        if speedups.available():
+            self.addCleanup(use_speedups, use_speedups(False))
+        super(PurePython, self).setUp()
+
+
+class TestNestedLookupPurePython(PurePython, test_nested_lookup.TestNestedLookup):
+    pass
+
+
+class TestGetAllKeysPurePython(PurePython, test_nested_lookup.TestGetAllKeys):
+    pass
+
+
+class TestGetOccurrencePurePython(PurePython, test_nested_lookup.TestGetOccurrence):
+    pass
+
+
+class TestNestedDeletePurePython(PurePython, test_lookup_api.TestNestedDelete):
+    pass
+
+
+class TestNestedUpdatePurePython(PurePython, test_lookup_api.TestNestedUpdate):
+    pass
@@ -0,0 +1,121 @@
+import threading
+from unittest import TestCase
+
+from nested_lookup import (
+    nested_lookup,
+    nested_find_first,
+    nested_update,
+    nested_delete,
+    nested_alter,
+    get_occurrence_of_key,
+    get_occurrence_of_value,
+    collect_stats,
+    with_stats,
+    TraversalStats,
+)
+from nested_lookup.stats import current_stats
+
+
+class TestStats(TestCase):
+    def setUp(self):
+        self.document = {
+            "name": "a",
+            "children": [
+                {"name": "b", "tags": ["x", "y"]},
+                {"name": "c", "meta": {"name": "d"}},
+            ],
+        }
+
+    def test_lookup_stats(self):
+        with collect_stats() as stats:
+            result = nested_lookup("name", self.document)
+        self.assertEqual(["a", "b", "c", "d"], sorted(result))
+        # name, children, name, tags, name, meta, name
+        self.assertEqual(7, stats.nodes)
+        self.assertEqual(7, stats.keys_compared)
+        self.assertEqual(4, stats.matches)
+        # the document, the two children and meta
+        self.assertEqual(4, stats.dicts)
+        # children and the tags (skipped as it holds no dicts)
+        self.assertEqual(2, stats.lists)
+        # document > children > child > meta
+        self.assertEqual(4, stats.max_depth)
+        self.assertEqual(0, stats.callback_time)
+        self.assertEqual(0, stats.deepcopy_time)
+
+    def test_stats_accumulate_over_calls(self):
+        with collect_stats() as stats:
+            nested_lookup("name", self.document)
+            get_occurrence_of_key(self.document, "name")
+        self.assertEqual(8, stats.matches)
+        self.assertEqual(14, stats.nodes)
+        self.assertEqual(4, stats.max_depth)
+
+    def test_no_stats_outside_of_block(self):
+        self.assertIsNone(current_stats())
+        with collect_stats() as stats:
+            self.assertIs(stats, current_stats())
+        self.assertIsNone(current_stats())
+        nested_lookup("name", self.document)
+        self.assertEqual(0, stats.nodes)
+
+    def test_nested_blocks_count_into_innermost(self):
+        with collect_stats() as outer:
+            with collect_stats() as inner:
+                nested_lookup("name", self.document)
+            nested_lookup("meta", self.document)
+        self.assertEqual(4, inner.matches)
+        self.assertEqual(1, outer.matches)
+
+    def test_early_exit_counts_walked_nodes(self):
+        with collect_stats() as stats:
+            self.assertEqual("a", nested_find_first("name", self.document))
+        self.assertEqual(1, stats.nodes)
+        self.assertEqual(1, stats.matches)
+
+    def test_occurrence_of_value_stats(self):
+        with collect_stats() as stats:
+            self.assertEqual(1, get_occurrence_of_value(self.document, "x"))
+        self.assertEqual(1, stats.matches)
+        # the elements of the lists are compared too
+        self.assertEqual(11, stats.keys_compared)
+
+    def test_update_and_delete_stats(self):
+        for in_place in (False, True):
+            result, stats = with_stats(
+                nested_update, self.document, "name", "z", in_place=in_place
+            )
+            self.assertEqual(["z"] * 4, nested_lookup("name", result))
+            self.assertEqual(4, stats.matches)
+
+        result, stats = with_stats(nested_delete, self.document, "name")
+        self.assertEqual([], nested_lookup("name", result))
+        self.assertEqual(4, stats.matches)
+
+    def test_alter_stats(self):
+        result, stats = with_stats(nested_alter, self.document, "name", str.upper)
+        self.assertEqual(["A", "B", "C", "D"], sorted(nested_lookup("name", result)))
+        self.assertIsInstance(stats, TraversalStats)
+        self.assertEqual(4, stats.matches)
+        self.assertGreater(stats.callback_time, 0)
+        self.assertGreater(stats.deepcopy_time, 0)
+
+        result, stats = with_stats(
+            nested_alter, self.document, "name", str.upper, in_place=True
+        )
+        self.assertEqual(0, stats.deepcopy_time)
+
+    def test_stats_are_per_thread(self):
+        def lookup():
+            nested_lookup("name", self.document)
+
+        with collect_stats() as stats:
+            thread = threading.Thread(target=lookup)
+            thread.start()
+            thread.join()
+        self.assertEqual(0, stats.nodes)
+
+    def test_as_dict(self):
+        stats = TraversalStats()
+        self.assertEqual(0, stats.as_dict()["nodes"])
+        self.assertIn("max_depth=0", repr(stats))
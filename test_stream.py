@@ -0,0 +1,86 @@
+import io
+import json
+from unittest import TestCase
+
+from nested_lookup import nested_lookup, nested_lookup_stream
+
+
+class TestNestedLookupStream(TestCase):
+    def setUp(self):
+        self.document = {
+            "build_version": {
+                "model_name": u"MacBook Pro \"2018\" \u00e9\u6f22",
+                "build_version": {
+                    "processor_name": "Intel Core i7",
+                    "core_details": {"build_version": 4, "memory": 2.5e-3},
+                },
+                "number_of_cores": -12,
+                "memory": None,
+            },
+            "hardware": [
+                {"memory": [True, False, [], {}], "zones": ["mz\\dfw", 0.5]},
+                [{"Build_Version": "17G65", "5": {"memory": {"memory": {"memory": 1}}}}],
+            ],
+            "empty": {},
+        }
+        self.text = json.dumps(self.document, indent=2, ensure_ascii=False)
+
+    def lookup(self, key, chunk_size=65536, binary=False, **kwargs):
+        if binary:
+            fileobj = io.BytesIO(self.text.encode("utf-8"))
+        else:
+            fileobj = io.StringIO(self.text)
+        return list(
+            nested_lookup_stream(key, fileobj, chunk_size=chunk_size, **kwargs)
+        )
+
+    def test_same_as_nested_lookup(self):
+        for key in ["build_version", "memory", "zones", "5", "missing", "empty"]:
+            self.assertEqual(nested_lookup(key, self.document), self.lookup(key))
+
+    def test_small_chunks(self):
+        for chunk_size in [1, 2, 3, 7]:
+            for binary in [False, True]:
+                self.assertEqual(
+                    nested_lookup("memory", self.document),
+                    self.lookup("memory", chunk_size=chunk_size, binary=binary),
+                )
+                self.assertEqual(
+                    nested_lookup("model_name", self.document),
+                    self.lookup("model_name", chunk_size=chunk_size, binary=binary),
+                )
+
+    def test_wild_with_keys(self):
+        expected = nested_lookup("VERSION", self.document, wild=True, with_keys=True)
+        results = self.lookup("VERSION", wild=True, with_keys=True)
+        self.assertEqual(sum(len(v) for v in expected.values()), len(results))
+        for k, v in results:
+            self.assertIn(v, expected[k])
+        self.assertEqual(
+            nested_lookup("VERSION", self.document, wild=True),
+            [v for _, v in results],
+        )
+
+    def test_nested_matches_share_objects(self):
+        outer, inner, innermost = self.lookup("memory")[-3:]
+        self.assertIs(outer["memory"], inner)
+        self.assertEqual(1, innermost)
+
+    def test_top_level_scalar_and_list(self):
+        for text in [u"3", u"[]", u'[{"a": 1}, [{"a": [2]}]]', u'"a"']:
+            self.assertEqual(
+                nested_lookup("a", json.loads(text)),
+                list(nested_lookup_stream("a", io.StringIO(text), chunk_size=1)),
+            )
+
+    def test_malformed_documents(self):
+        for text in [
+            u'{"a": 1',
+            u'{"a" 1}',
+            u"[1,]",
+            u'{"a": tru}',
+            u"[1] 2",
+            u'{"a": "b',
+        ]:
+            with self.assertRaises(ValueError):
+                list(nested_lookup_stream("a", io.StringIO(text), chunk_size=2))